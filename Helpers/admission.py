@@ -0,0 +1,142 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+from fastapi import Depends, HTTPException, status
+from Helpers.jwt_helpers import get_current_user
+from Helpers.metrics import CallbackGauge
+
+VECTOR_RATE_PER_SECOND = float(os.getenv("VECTOR_RATE_PER_SECOND", "2"))
+VECTOR_BURST = float(os.getenv("VECTOR_BURST", "10"))
+VECTOR_MAX_CONCURRENT = int(os.getenv("VECTOR_MAX_CONCURRENT", "4"))
+VECTOR_MAX_TRACKED_USERS = int(os.getenv("VECTOR_MAX_TRACKED_USERS", "10000"))
+
+# Token cost per call, roughly the number of encoder passes and DB lookups
+VECTOR_ENDPOINT_COSTS = {
+    "search": 1,
+    "recommend": 2,
+    "recommendBasedOnHistory": 2,
+    "recommendBasedOnLikedMovies": 5,
+    "upload": 10,
+    "process": 10,
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """Take cost tokens, returns 0 on success or the seconds until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Per-user token buckets plus a global cap on requests in flight.
+
+    Requests are rejected straight away rather than queued: 503 when the cap
+    is reached, 429 when the caller's bucket cannot pay the endpoint cost.
+    Buckets of the least recently seen users are evicted past max_users.
+    """
+
+    def __init__(self, rate: float, burst: float, max_concurrent: int, max_users: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_users = max_users
+        self.in_flight = 0
+        self.admitted: Dict[str, int] = {}
+        self.rejected: Dict[tuple, int] = {}
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, user_id: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def acquire(self, user_id: Hashable, endpoint: str, cost: float) -> Optional[HTTPException]:
+        """Admit a request or return the exception to reject it with"""
+        with self._lock:
+            if self.in_flight >= self.max_concurrent:
+                self.rejected[(endpoint, "overloaded")] = self.rejected.get((endpoint, "overloaded"), 0) + 1
+                return HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Vector search is at capacity, please retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+
+            retry_after = self._bucket(user_id).take(min(cost, self.burst))
+            if retry_after:
+                self.rejected[(endpoint, "rate_limited")] = self.rejected.get((endpoint, "rate_limited"), 0) + 1
+                return HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many vector requests, please slow down",
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+            self.in_flight += 1
+            self.admitted[endpoint] = self.admitted.get(endpoint, 0) + 1
+            return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        """Copies of the admitted and rejected counts, safe to iterate while requests run"""
+        with self._lock:
+            return dict(self.admitted), dict(self.rejected)
+
+
+vector_admission_controller = AdmissionController(
+    VECTOR_RATE_PER_SECOND, VECTOR_BURST, VECTOR_MAX_CONCURRENT, VECTOR_MAX_TRACKED_USERS
+)
+
+CallbackGauge(
+    "vector_admission_admitted_total", "Vector requests admitted", ["endpoint"],
+    lambda: {(endpoint,): count for endpoint, count in vector_admission_controller.snapshot()[0].items()},
+    type="counter",
+)
+CallbackGauge(
+    "vector_admission_rejected_total", "Vector requests shed by the admission controller", ["endpoint", "reason"],
+    lambda: vector_admission_controller.snapshot()[1],
+    type="counter",
+)
+CallbackGauge(
+    "vector_admission_in_flight", "Vector requests currently admitted", [],
+    lambda: {(): vector_admission_controller.in_flight},
+)
+
+
+def vector_admission(endpoint: str):
+    """Dependency that admits a /vector call for the current user or sheds it"""
+    cost = VECTOR_ENDPOINT_COSTS.get(endpoint, 1)
+
+    async def admit(current_user=Depends(get_current_user)):
+        rejection = vector_admission_controller.acquire(current_user.id, endpoint, cost)
+        if rejection:
+            raise rejection
+        try:
+            yield
+        finally:
+            vector_admission_controller.release()
+
+    return admit
@@ -0,0 +1,190 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Tuple
+from Helpers.keys import call_key
+from Helpers.metrics import CallbackGauge, Counter
+from Helpers.ttl_cache import TTLCache
+
+DB_BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES", "5"))
+DB_BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "30"))
+# Request-path catalog reads slower than this count as failures. A query
+# that already started keeps running on one of DB_DEADLINE_WORKERS threads
+# until it ends, queued ones are cancelled. At most DB_DEADLINE_QUEUE calls
+# wait for a thread, more are refused without reaching the database
+DB_QUERY_TIMEOUT_SECONDS = float(os.getenv("DB_QUERY_TIMEOUT_SECONDS", "5"))
+DB_DEADLINE_WORKERS = int(os.getenv("DB_DEADLINE_WORKERS", "16"))
+DB_DEADLINE_QUEUE = int(os.getenv("DB_DEADLINE_QUEUE", "64"))
+# Last good results are kept this long to be served while the DB is failing
+DB_STALE_TTL_SECONDS = float(os.getenv("DB_STALE_TTL_SECONDS", "86400"))
+DB_STALE_CACHE_SIZE = int(os.getenv("DB_STALE_CACHE_SIZE", "1000"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_breakers: List["CircuitBreaker"] = []
+
+_executors: Dict[int, Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]] = {}
+_executors_lock = threading.Lock()
+
+SHORT_CIRCUITED = Counter("db_circuit_short_circuited_total", "Calls not sent to the database because the circuit was open", ["breaker", "function"])
+STALE_SERVED = Counter("db_stale_served_total", "Calls answered from the last good result", ["breaker", "function"])
+TIMED_OUT = Counter("db_deadline_exceeded_total", "Guarded calls that missed their deadline", ["breaker", "function"])
+BACKLOG_FULL = Counter("db_deadline_rejected_total", "Guarded calls refused because the query backlog was full", ["breaker", "function"])
+
+
+class BacklogFull(Exception):
+    pass
+
+
+def _executor() -> Tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+    """
+    Deadline threads of this process and the slots bounding calls running or
+    queued on them, serve.py workers each get their own after fork
+    """
+    with _executors_lock:
+        entry = _executors.get(os.getpid())
+        if entry is None:
+            entry = _executors[os.getpid()] = (
+                ThreadPoolExecutor(DB_DEADLINE_WORKERS, thread_name_prefix="db-deadline"),
+                threading.BoundedSemaphore(DB_DEADLINE_WORKERS + DB_DEADLINE_QUEUE),
+            )
+        return entry
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and then fails calls
+    immediately. After reset_timeout one trial call is let through: success
+    closes the circuit, failure opens it for another reset_timeout.
+    Calls that take longer than deadline seconds count as failures.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, deadline: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.deadline = deadline
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.transitions: Dict[str, int] = {}
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        _breakers.append(self)
+
+    def _move(self, state: str):
+        if state != self.state:
+            self.state = state
+            self.transitions[state] = self.transitions.get(state, 0) + 1
+            print(f"Circuit {self.name} is {state}")
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._move(HALF_OPEN)
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            self._move(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._move(OPEN)
+
+    def guard(self, returns: int, stale: TTLCache = None):
+        """
+        Decorator for database functions returning a tuple that ends with an
+        error, returns is the tuple length. Failures and open-circuit calls
+        are answered with the last good result for the same arguments when
+        there is one, or with an error immediately.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = call_key(fn, args, kwargs)
+                if not self.allow():
+                    SHORT_CIRCUITED.inc(breaker=self.name, function=fn.__name__)
+                    return self._stale(fn.__name__, stale, key) or (None,) * (returns - 1) + ("Database unavailable, circuit open",)
+
+                try:
+                    result = self._call(fn, args, kwargs)
+                except FutureTimeout:
+                    TIMED_OUT.inc(breaker=self.name, function=fn.__name__)
+                    self.record_failure()
+                    return self._stale(fn.__name__, stale, key) or (None,) * (returns - 1) + ("Database query timed out",)
+                except BacklogFull:
+                    BACKLOG_FULL.inc(breaker=self.name, function=fn.__name__)
+                    self.record_failure()
+                    return self._stale(fn.__name__, stale, key) or (None,) * (returns - 1) + ("Database busy, too many queries waiting",)
+                except BaseException:
+                    self.record_failure()
+                    raise
+                if result[-1]:
+                    self.record_failure()
+                    return self._stale(fn.__name__, stale, key) or result
+
+                self.record_success()
+                if stale is not None:
+                    stale.set(key, result)
+                return result
+            return wrapper
+        return decorator
+
+    def transition_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.transitions)
+
+    def _call(self, fn, args, kwargs):
+        if not self.deadline:
+            return fn(*args, **kwargs)
+        # Background jobs call unguarded functions and are not affected
+        executor, slots = _executor()
+        if not slots.acquire(blocking=False):
+            raise BacklogFull()
+        future = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        # Released when the call finishes or is cancelled
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeout:
+            # Still queued: it never reaches the database. Already running:
+            # cancel() is a no-op and the query finishes in the background
+            future.cancel()
+            raise
+
+    def _stale(self, function: str, stale: TTLCache, key):
+        result = stale.get(key) if stale is not None else None
+        if result is not None:
+            STALE_SERVED.inc(breaker=self.name, function=function)
+        return result
+
+
+CallbackGauge(
+    "db_circuit_state", "Circuit breaker state: 0 closed, 1 half open, 2 open", ["breaker"],
+    lambda: {(breaker.name,): STATE_VALUES[breaker.state] for breaker in _breakers},
+)
+CallbackGauge(
+    "db_circuit_transitions_total", "Circuit breaker state changes", ["breaker", "state"],
+    lambda: {(breaker.name, state): count for breaker in _breakers for state, count in breaker.transition_counts().items()},
+    type="counter",
+)
+
+catalog_breaker = CircuitBreaker("catalog", DB_BREAKER_FAILURES, DB_BREAKER_RESET_SECONDS, DB_QUERY_TIMEOUT_SECONDS)
+catalog_stale_cache = TTLCache(DB_STALE_CACHE_SIZE, DB_STALE_TTL_SECONDS)
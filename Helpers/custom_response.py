@@ -1,8 +1,9 @@
 from fastapi.responses import JSONResponse
 
-def unified_response(success: bool, message: str, data: dict = None, status_code: int = 200):
+def unified_response(success: bool, message: str, data: dict = None, status_code: int = 200, headers: dict = None):
     return JSONResponse(
         status_code=status_code,
+        headers=headers,
         content={
             "success": success,
             "message": message,
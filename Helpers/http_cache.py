@@ -0,0 +1,66 @@
+import hashlib
+from typing import Dict
+from fastapi import HTTPException, Request, status
+from Helpers.metrics import Counter
+from Modules.catalog_sync import catalog_watcher
+
+# Cache-Control per catalog route. Content only changes when the catalog
+# watcher picks up a new fingerprint, stale-while-revalidate lets a CDN keep
+# serving while it revalidates with If-None-Match. There is no Last-Modified:
+# the catalog tables carry no update times, and the time a worker noticed a
+# change differs between workers and restarts, so the ETag is the only validator
+CATALOG_CACHE_POLICIES = {
+    "movie": "public, max-age=300, stale-while-revalidate=600",
+    "genres": "public, max-age=3600, stale-while-revalidate=86400",
+    "genre_movies": "public, max-age=60, stale-while-revalidate=300",
+}
+
+NOT_MODIFIED = Counter("http_not_modified_total", "Conditional requests answered with 304", ["policy"])
+
+_etags: Dict[tuple, str] = {}
+
+
+def catalog_etag() -> str:
+    """
+    Weak ETag of the catalog, derived from the catalog fingerprint so every
+    worker and every restart agree on it. Empty until the first poll.
+    """
+    fingerprint = catalog_watcher.fingerprint
+    if fingerprint is None:
+        return ""
+    etag = _etags.get(fingerprint)
+    if etag is None:
+        _etags.clear()
+        etag = _etags[fingerprint] = 'W/"' + hashlib.blake2b(repr(fingerprint).encode(), digest_size=12).hexdigest() + '"'
+    return etag
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, W/ prefixes are ignored on both sides
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def catalog_cache(policy: str):
+    """
+    Dependency for read-mostly catalog routes: answers 304 before the endpoint
+    runs when the client's ETag is current, otherwise returns the ETag and
+    Cache-Control headers for the success response
+    """
+    cache_control = CATALOG_CACHE_POLICIES[policy]
+
+    def check(request: Request) -> Dict[str, str]:
+        etag = catalog_etag()
+        if not etag:
+            return {}
+
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag):
+            NOT_MODIFIED.inc(policy=policy)
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return headers
+
+    return check
@@ -1,7 +1,13 @@
 from jose import jwt
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
 import bcrypt
 from database import user_db
+from Models.auth_models import AuthContext
+from Helpers.metrics import CallbackGauge
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
@@ -9,6 +15,10 @@ SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 EXPIRY_MINUTES = 60
 
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
 security = HTTPBearer()
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -18,29 +28,97 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
-def verify_access_token(token: str):
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a hash was made with a different cost factor than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool so it never blocks the event
+    loop. At most workers + queue_limit calls are admitted at once, further
+    calls fail fast with PasswordHasherBusy.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._slots.release()
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+CallbackGauge(
+    "password_hasher_rejected_total", "Password hashing calls rejected because the executor was saturated", [],
+    lambda: {(): password_hasher.rejected},
+    type="counter",
+)
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+def decode_access_token(token: str):
+    """
+    Verify a token and return its claims as the request's auth context,
+    without touching the database
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        if payload:
-            result = user_db.find_user_by_email_or_username(email=payload.get("email"))
-            return result
-        
     except jwt.ExpiredSignatureError:
         return False
     except jwt.JWTError:
         return False
 
+    if not payload or payload.get("id") is None:
+        return False
+    return AuthContext(id=payload["id"], email=payload.get("email"), username=payload.get("username"))
+
+def verify_access_token(token: str):
+    """
+    Verify a token and return the full user record, served from the
+    short-lived user cache
+    """
+    context = decode_access_token(token)
+    if not context:
+        return False
+    return user_db.find_user_by_id(context.id)
+
+def _unauthorized():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    context = decode_access_token(credentials.credentials)
+    if not context:
+        raise _unauthorized()
+    return context
+
+async def get_current_user_profile(credentials: HTTPAuthorizationCredentials = Depends(security)):
     user = verify_access_token(credentials.credentials)
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized()
     return user
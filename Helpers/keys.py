@@ -0,0 +1,18 @@
+from typing import Hashable
+
+
+def freeze(value) -> Hashable:
+    """Hashable cache key for argument lists such as a list of ids"""
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def call_key(fn, args: tuple, kwargs: dict) -> Hashable:
+    """Key of a call by function and arguments"""
+    return (fn.__module__, fn.__name__, freeze(args), freeze(sorted(kwargs.items())))
+
+
+def normalize_query(query: str) -> str:
+    """Search text with case and spacing folded, for counting and sharing searches"""
+    return " ".join(query.lower().split())
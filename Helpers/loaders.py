@@ -0,0 +1,108 @@
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from database.movie_db import get_actors_by_ids_from_db, get_movies_by_ids_from_db
+from Helpers.metrics import Counter
+
+LOADER_BATCHES = Counter("loader_batches_total", "IN queries issued by request loaders", ["entity"])
+LOADER_KEYS = Counter("loader_keys_total", "Ids fetched by request loaders", ["entity"])
+LOADER_HITS = Counter("loader_cache_hits_total", "Ids served from a request loader's memo", ["entity"])
+
+
+class BatchLoader:
+    """
+    DataLoader style batcher for one entity type.
+
+    Ids queued with prime() or asked for with load()/load_many() are fetched
+    together with a single batch_fn(ids) call, batch_fn returns (items, error)
+    like the database functions. Results, misses included, are memoized for
+    the lifetime of the loader, which is one request.
+    """
+
+    def __init__(self, entity: str, batch_fn: Callable[[List], Tuple[list, Optional[str]]], key: Callable):
+        self.entity = entity
+        self.batch_fn = batch_fn
+        self.key = key
+        self._cache: Dict[Hashable, object] = {}
+        self._pending: Dict[Hashable, None] = {}
+        # Sync endpoints and the threadpool may share a request's loaders
+        self._lock = threading.Lock()
+
+    def prime(self, ids: Iterable[Hashable]):
+        """Queue ids for the next batch without fetching them yet"""
+        with self._lock:
+            for id_ in ids:
+                if id_ is not None and id_ not in self._cache:
+                    self._pending[id_] = None
+
+    def _dispatch(self) -> Optional[str]:
+        with self._lock:
+            if not self._pending:
+                return None
+            ids = list(self._pending)
+            self._pending.clear()
+            items, error = self.batch_fn(ids)
+            if error:
+                # Not memoized, a later load retries them
+                return error
+            found = {self.key(item): item for item in items}
+            for id_ in ids:
+                self._cache[id_] = found.get(id_)
+        LOADER_BATCHES.inc(entity=self.entity)
+        LOADER_KEYS.inc(len(ids), entity=self.entity)
+        return None
+
+    def load_many(self, ids: Iterable[Hashable]) -> Tuple[list, Optional[str]]:
+        """Items for ids in order, ids that do not exist are skipped"""
+        ids = [id_ for id_ in ids if id_ is not None]
+        cached = sum(1 for id_ in ids if id_ in self._cache)
+        if cached:
+            LOADER_HITS.inc(cached, entity=self.entity)
+        self.prime(ids)
+        error = self._dispatch()
+        items = [self._cache.get(id_) for id_ in ids]
+        return [item for item in items if item is not None], error
+
+    def load(self, id_: Hashable) -> Tuple[object, Optional[str]]:
+        """One item or None, with the error of the batch it was fetched in"""
+        items, error = self.load_many([id_])
+        return (items[0] if items else None), error
+
+
+class RequestLoaders:
+    def __init__(self):
+        self.movies = BatchLoader("movies", get_movies_by_ids_from_db, lambda movie: movie.movie_id)
+        # Movies without cast and genres, for result lists such as title search
+        self.movie_summaries = BatchLoader(
+            "movie_summaries",
+            lambda movie_ids: get_movies_by_ids_from_db(movie_ids, include_relations=False),
+            lambda movie: movie.movie_id,
+        )
+        self.actors = BatchLoader("actors", get_actors_by_ids_from_db, lambda actor: actor.actor_id)
+
+
+_request_loaders: ContextVar[Optional[RequestLoaders]] = ContextVar("request_loaders", default=None)
+
+
+def request_loaders() -> RequestLoaders:
+    """The current request's loaders, a throwaway set outside of a request"""
+    loaders = _request_loaders.get()
+    return loaders if loaders is not None else RequestLoaders()
+
+
+class LoaderMiddleware:
+    """ASGI middleware giving every HTTP request its own RequestLoaders"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_loaders.set(RequestLoaders())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_loaders.reset(token)
@@ -0,0 +1,203 @@
+import asyncio
+import functools
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool as starlette_run_in_threadpool
+
+load_dotenv()
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.002"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "50"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+PROFILE_HEADER = "x-profile"
+
+# The middleware is only installed when one of the triggers is configured
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+_ids = itertools.count(1)
+profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+
+def frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class RequestSampler(threading.Thread):
+    """
+    Statistical profiler for one request.
+
+    Every interval it snapshots the threads doing this request's work: the
+    event loop thread while the request's own task is the one running, and
+    thread pool threads while they run work the request handed off (see
+    sampled and run_in_threadpool). Concurrent requests are not mixed in.
+    """
+
+    def __init__(self, interval: float, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.loop = loop
+        self.task = task
+        self.loop_thread = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def attach(self):
+        """Sample the calling thread until the matching detach()"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def detach(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def stop(self):
+        """Stop sampling without waiting for the thread, stacks are final once this returns"""
+        with self._lock:
+            self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            on_loop = asyncio.current_task(self.loop) is self.task
+            with self._lock:
+                if self._stop_event.is_set():
+                    return
+                self.samples += 1
+                threads = set(self._threads)
+                if on_loop:
+                    threads.add(self.loop_thread)
+                for thread_id in threads:
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame_label(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        self.stacks[";".join(reversed(stack))] += 1
+
+
+_active_sampler: ContextVar[Optional[RequestSampler]] = ContextVar("active_sampler", default=None)
+
+
+def sampled(fn):
+    """Wrap fn so the thread running it is sampled by the current request's profile, if any"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        sampler = _active_sampler.get()
+        if sampler is None:
+            return fn(*args, **kwargs)
+        sampler.attach()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sampler.detach()
+    return wrapper
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """starlette's run_in_threadpool, with the worker thread sampled while profiling"""
+    return await starlette_run_in_threadpool(sampled(func), *args, **kwargs)
+
+
+def sample_sync_endpoints(routes):
+    """
+    FastAPI runs sync endpoints in the thread pool itself, wrap their calls so
+    those threads are sampled too
+    """
+    for route in routes:
+        if isinstance(route, APIRoute) and not asyncio.iscoroutinefunction(route.dependant.call):
+            route.dependant.call = sampled(route.dependant.call)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests carrying the X-Profile header with PROFILE_TOKEN, plus
+    a random PROFILE_SAMPLE_RATE share of all requests. Profiles go to a
+    ring buffer and the response gets an X-Profile-Id header.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        sample_sync_endpoints(routes)
+        self._slots = threading.BoundedSemaphore(PROFILE_MAX_CONCURRENT)
+
+    def _requested(self, scope) -> bool:
+        if PROFILE_TOKEN:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER.encode() and value.decode() == PROFILE_TOKEN:
+                    return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope) or not self._slots.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_ids)
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", str(profile_id).encode())]
+            await send(message)
+
+        sampler = RequestSampler(PROFILE_INTERVAL_SECONDS, asyncio.get_running_loop(), asyncio.current_task())
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        token = _active_sampler.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            _active_sampler.reset(token)
+            self._slots.release()
+            route = scope.get("route")
+            profiles.append({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status_code,
+                "started_at": started_at.isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "interval_ms": PROFILE_INTERVAL_SECONDS * 1000,
+                "samples": sampler.samples,
+                "stacks": sampler.stacks,
+            })
+
+
+def list_profiles() -> List[Dict]:
+    return [{key: value for key, value in profile.items() if key != "stacks"} for profile in reversed(profiles)]
+
+
+def get_profile(profile_id: int) -> Optional[Dict]:
+    for profile in profiles:
+        if profile["id"] == profile_id:
+            return profile
+    return None
+
+
+def collapsed_stacks(profile: Dict) -> str:
+    """Brendan Gregg's collapsed format, ready for flamegraph.pl or speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
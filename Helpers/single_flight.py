@@ -0,0 +1,77 @@
+import functools
+import os
+import threading
+from typing import Callable, Dict, Hashable
+from Helpers.keys import call_key
+from Helpers.metrics import Counter
+
+# Followers stop waiting for a stuck leader after this long and run the call themselves
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", os.getenv("DB_QUERY_TIMEOUT_SECONDS", "5")))
+
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Calls that ran (leader), shared an identical call in flight (coalesced) or gave up waiting for it (wait_timeout)",
+    ["function", "result"],
+)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller
+    runs fn, the others wait for it and get the same result or exception.
+    Nothing is kept once the call finishes, so a later call runs again.
+    Results are shared between callers and must be treated as read-only.
+    A follower waits at most wait_timeout, then makes its own call.
+    """
+
+    def __init__(self, wait_timeout: float = SINGLEFLIGHT_WAIT_SECONDS):
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        name = getattr(fn, "__name__", "call")
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                SINGLEFLIGHT_CALLS.inc(function=name, result="wait_timeout")
+                return fn(*args, **kwargs)
+            SINGLEFLIGHT_CALLS.inc(function=name, result="coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.inc(function=name, result="leader")
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def coalesced(fn):
+    """Decorator sharing one execution of fn between concurrent calls with equal arguments"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return flights.do(call_key(fn, args, kwargs), fn, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,99 @@
+import heapq
+import os
+import threading
+import time
+from typing import Dict, Hashable, List, Tuple
+import numpy as np
+
+TRENDING_WINDOW_SECONDS = float(os.getenv("TRENDING_WINDOW_SECONDS", "3600"))
+TRENDING_BUCKETS = int(os.getenv("TRENDING_BUCKETS", "12"))
+# Queries seen fewer times stay hidden, one-off searches can be personal
+TRENDING_QUERY_MIN_COUNT = int(os.getenv("TRENDING_QUERY_MIN_COUNT", "3"))
+
+
+class SlidingCountMinSketch:
+    """
+    Count-min sketch over a sliding window.
+
+    The window is split into buckets, each with its own depth x width counter
+    table, and a running total of the live buckets answers estimates. When
+    the window slides, the oldest bucket is subtracted from the total and
+    reused, so memory is fixed at (buckets + 1) tables.
+    """
+
+    def __init__(self, window: float, buckets: int, width: int = 2048, depth: int = 4):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self.width = width
+        self.depth = depth
+        # Multiply-shift hashing, one random odd multiplier per row. Python's
+        # tuple hashes put small ints in the same column on every row
+        self._multipliers = np.random.default_rng().integers(1, 2**63, size=depth, dtype=np.uint64) | np.uint64(1)
+        self._shift = np.uint64(64 - (width.bit_length() - 1))
+        self.bucket_seconds = window / buckets
+        self.tables = np.zeros((buckets, depth, width), dtype=np.int64)
+        self.total = np.zeros((depth, width), dtype=np.int64)
+        self.current = 0
+        self.current_start = time.monotonic()
+        self._rows = np.arange(depth)
+
+    def _advance(self, now: float):
+        steps = int((now - self.current_start) // self.bucket_seconds)
+        if steps <= 0:
+            return
+        for _ in range(min(steps, len(self.tables))):
+            self.current = (self.current + 1) % len(self.tables)
+            self.total -= self.tables[self.current]
+            self.tables[self.current] = 0
+        self.current_start += steps * self.bucket_seconds
+
+    def _columns(self, key: Hashable) -> np.ndarray:
+        return ((self._multipliers * np.uint64(hash(key) & 0xFFFFFFFFFFFFFFFF)) >> self._shift).astype(np.intp)
+
+    def add(self, key: Hashable, count: int = 1, now: float = None):
+        self._advance(time.monotonic() if now is None else now)
+        columns = self._columns(key)
+        self.tables[self.current, self._rows, columns] += count
+        self.total[self._rows, columns] += count
+
+    def estimate(self, key: Hashable, now: float = None) -> int:
+        self._advance(time.monotonic() if now is None else now)
+        return int(self.total[self._rows, self._columns(key)].min())
+
+
+class TrendingTracker:
+    """
+    Sliding-window heavy hitters: a count-min sketch estimates every key and
+    a bounded candidate set keeps the keys that currently rank highest.
+    Reads re-estimate only the candidates, so they cost O(capacity)
+    whatever the traffic.
+    """
+
+    def __init__(self, window: float = TRENDING_WINDOW_SECONDS, buckets: int = TRENDING_BUCKETS, capacity: int = 200):
+        self.sketch = SlidingCountMinSketch(window, buckets)
+        self.capacity = capacity
+        self.candidates: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, count: int = 1):
+        with self._lock:
+            self.sketch.add(key, count)
+            self.candidates[key] = self.sketch.estimate(key)
+            # Cheaper than a heap with updates: let the set grow to twice the
+            # capacity, then keep the top half
+            if len(self.candidates) >= 2 * self.capacity:
+                keep = heapq.nlargest(self.capacity, self.candidates.items(), key=lambda item: item[1])
+                self.candidates = dict(keep)
+
+    def top(self, k: int, min_count: int = 1) -> List[Tuple[Hashable, int]]:
+        """The k keys with the highest counts in the window, with their estimated counts"""
+        with self._lock:
+            estimates = {key: self.sketch.estimate(key) for key in self.candidates}
+            # Keys that slid out of the window leave the candidate set
+            self.candidates = {key: estimate for key, estimate in estimates.items() if estimate > 0}
+            ranked = heapq.nlargest(k, self.candidates.items(), key=lambda item: item[1])
+        return [(key, count) for key, count in ranked if count >= min_count]
+
+
+trending_queries = TrendingTracker()
+trending_movies = TrendingTracker()
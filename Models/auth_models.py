@@ -12,4 +12,9 @@ class Users(BaseModel):
 class Login(BaseModel):
     username: Optional[str] = None
     password: str
-    email: Optional[str] = None
\ No newline at end of file
+    email: Optional[str] = None
+
+class AuthContext(BaseModel):
+    id: int
+    email: Optional[str] = None
+    username: Optional[str] = None
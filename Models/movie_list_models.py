@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import date
 
 
@@ -47,6 +47,7 @@ class MovieListResponse(BaseModel):
     total_count: int
     page: int
     page_size: int
+    facets: Optional[Dict[str, Dict[str, int]]] = None
 
 
 class MovieDetailResponse(BaseModel):
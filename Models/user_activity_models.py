@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class FavoriteMovies(BaseModel):
+    movie_ids: List[int] = Field(..., max_length=1000)
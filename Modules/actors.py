@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Query
+from database.movie_db import get_movies_by_actor_from_db
+from Helpers.custom_response import unified_response
+from Helpers.loaders import request_loaders
+from Modules import cast_graph
+from Modules.movies import format_movie_data
+
+actors = APIRouter(prefix="/actor", tags=["Actors"])
+
+def format_actor_data(actor_data):
+    return {
+        "actor_id": actor_data.actor_id,
+        "actor_name": actor_data.actor_name,
+        "gender": actor_data.gender,
+        "profile_path": actor_data.profile_path
+    }
+
+@actors.get("/{actor_id}")
+def get_actor_by_id(actor_id: int):
+    """Get an actor with the number of movies they appear in"""
+    actor_data, error = request_loaders().actors.load(actor_id)
+
+    if error:
+        return unified_response(False, f"Error fetching actor: {error}", status_code=500)
+
+    if not actor_data:
+        return unified_response(False, "Actor not found", status_code=404)
+
+    formatted_actor = format_actor_data(actor_data)
+    graph = cast_graph.cast_graph
+    if graph is not None:
+        formatted_actor["movie_count"] = len(graph.movies_of(actor_id))
+
+    return unified_response(True, "Actor details fetched successfully", data={"actor": formatted_actor})
+
+@actors.get("/{actor_id}/movies")
+def get_movies_by_actor(
+    actor_id: int,
+    page: int = Query(1, ge=1, description="Page number"),
+    page_size: int = Query(10, ge=1, le=100, description="Number of movies per page")
+):
+    """Get the filmography of an actor"""
+    graph = cast_graph.cast_graph
+    if graph is not None:
+        movie_ids = graph.movies_of(actor_id)
+        total_count = len(movie_ids)
+        skip = (page - 1) * page_size
+        movies_data, error = request_loaders().movies.load_many(movie_ids[skip:skip + page_size])
+    else:
+        movies_data, total_count, error = get_movies_by_actor_from_db(
+            actor_id=actor_id,
+            page=page,
+            page_size=page_size
+        )
+
+    if error:
+        return unified_response(False, f"Error fetching movies by actor: {error}", status_code=500)
+
+    formatted_movies = []
+    for movie in movies_data:
+        formatted_movie = format_movie_data(movie)
+        if formatted_movie:
+            formatted_movies.append(formatted_movie)
+
+    response_data = {
+        "movies": formatted_movies,
+        "total_count": total_count,
+        "page": page,
+        "page_size": page_size,
+        "actor_id": actor_id,
+    }
+
+    return unified_response(True, f"Movies for actor {actor_id} fetched successfully", data=response_data)
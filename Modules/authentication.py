@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException
+from Helpers.profiling import run_in_threadpool
 from typing import Optional
 from Models.auth_models import Users as UserSchema
 from Models.auth_models import Login as LoginSchema
 from Helpers.custom_response import unified_response
-from Helpers.jwt_helpers import create_access_token, hash_password, verify_password, verify_access_token
-from database.user_db import create_user_in_db, find_user_by_email_or_username
+from Helpers.jwt_helpers import (
+    create_access_token,
+    hash_password_async,
+    verify_password_async,
+    password_needs_rehash,
+    PasswordHasherBusy,
+    verify_access_token,
+    decode_access_token
+)
+from database.user_db import create_user_in_db, find_user_by_email_or_username, update_user_password
 
 auth = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -13,16 +22,33 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid token format")
     
     token = authorization.split(" ")[1]
-    user = verify_access_token(token)
+    context = decode_access_token(token)
     
-    if not user:
+    if not context:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return {"id": user.id, "email": user.email, "username": user.username}
+    return context.model_dump()
+
+def hasher_busy_response():
+    return unified_response(False, "Server is busy, please retry shortly", status_code=503, headers={"Retry-After": "1"})
+
+async def rehash_password(user_id: int, password: str):
+    """Re-hash a password with the current BCRYPT_ROUNDS after a successful login"""
+    try:
+        hashed_password = await hash_password_async(password)
+    except PasswordHasherBusy:
+        # Not urgent, the next login tries again
+        return
+    success, error = await run_in_threadpool(update_user_password, user_id, hashed_password)
+    if error:
+        print(f"Error re-hashing password: {error}")
 
 @auth.post("/signup")
 async def create_user(user: UserSchema):
-    hashed_password = hash_password(user.password)
+    try:
+        hashed_password = await hash_password_async(user.password)
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     user_data = user.model_dump()
     user_data["password"] = hashed_password
 
@@ -39,13 +65,20 @@ async def create_user(user: UserSchema):
     return unified_response(False, f"An error occurred: {error}", status_code=500)
 
 @auth.post("/login")
-async def login(user: LoginSchema):
+async def login(user: LoginSchema, background_tasks: BackgroundTasks):
     response = find_user_by_email_or_username(email=user.email, username=user.username)
     if not response:
         return unified_response(False, "User not found", status_code=404)
 
-    if verify_password(user.password, response.password):
-        token_data = {"email": response.email, "id": response.id}
+    try:
+        password_valid = await verify_password_async(user.password, response.password)
+    except PasswordHasherBusy:
+        return hasher_busy_response()
+
+    if password_valid:
+        if password_needs_rehash(response.password):
+            background_tasks.add_task(rehash_password, response.id, user.password)
+        token_data = {"email": response.email, "id": response.id, "username": response.username}
         token = create_access_token(token_data)
         return unified_response(True, "Login successful", data=token)
     else:
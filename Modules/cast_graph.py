@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from database.movie_db import get_cast_pairs_from_db
+from Modules.catalog_sync import catalog_watcher
+
+# Pending edge changes above this share of the graph trigger a full rebuild
+COMPACT_RATIO = 0.05
+
+
+def encode_pairs(pairs: List[Tuple[int, int]]) -> np.ndarray:
+    """Pack (movie_id, actor_id) pairs into sorted unique int64 edge keys"""
+    if not pairs:
+        return np.empty(0, dtype=np.int64)
+    edges = np.array(pairs, dtype=np.int64)
+    return np.unique((edges[:, 0] << 32) | edges[:, 1])
+
+
+class Adjacency:
+    """Compressed sparse rows, the neighbours of keys[i] are values[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, sources: np.ndarray, targets: np.ndarray):
+        order = np.lexsort((targets, sources))
+        sources = sources[order]
+        self.values = targets[order]
+        self.keys, counts = np.unique(sources, return_counts=True)
+        self.offsets = np.zeros(len(self.keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def get(self, key: int) -> np.ndarray:
+        position = np.searchsorted(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return self.values[:0]
+        return self.values[self.offsets[position]:self.offsets[position + 1]]
+
+
+class CastGraph:
+    """
+    Actor to movie and movie to actor adjacency built from movie_cast.
+
+    The base is two CSR arrays built in one pass. Later catalog changes are
+    diffed against the stored edge set and kept as a small overlay of added
+    and removed edges until they are big enough to be worth a rebuild.
+    """
+
+    def __init__(self, pairs: List[Tuple[int, int]]):
+        self._lock = threading.Lock()
+        self._build(encode_pairs(pairs))
+
+    def _build(self, edges: np.ndarray):
+        movie_ids = edges >> 32
+        actor_ids = edges & 0xFFFFFFFF
+        self.edges = edges
+        self.actor_movies = Adjacency(actor_ids, movie_ids)
+        self.movie_actors = Adjacency(movie_ids, actor_ids)
+        self.added_actor_movies: Dict[int, Set[int]] = {}
+        self.added_movie_actors: Dict[int, Set[int]] = {}
+        self.removed: Set[Tuple[int, int]] = set()
+
+    def apply(self, pairs: List[Tuple[int, int]]) -> int:
+        """Bring the graph in line with the current movie_cast rows, returns the number of changed edges"""
+        edges = encode_pairs(pairs)
+        with self._lock:
+            added = np.setdiff1d(edges, self.edges, assume_unique=True)
+            removed = np.setdiff1d(self.edges, edges, assume_unique=True)
+            changed = len(added) + len(removed)
+            if changed > COMPACT_RATIO * max(len(self.edges), 1):
+                self._build(edges)
+                return changed
+
+            # The overlay is rebuilt from scratch against the untouched base
+            self.added_actor_movies, self.added_movie_actors, self.removed = {}, {}, set()
+            for edge in added.tolist():
+                movie_id, actor_id = edge >> 32, edge & 0xFFFFFFFF
+                self.added_actor_movies.setdefault(actor_id, set()).add(movie_id)
+                self.added_movie_actors.setdefault(movie_id, set()).add(actor_id)
+            for edge in removed.tolist():
+                self.removed.add((edge >> 32, edge & 0xFFFFFFFF))
+            return changed
+
+    def movies_of(self, actor_id: int) -> List[int]:
+        with self._lock:
+            movie_ids = self.actor_movies.get(actor_id).tolist()
+            if self.removed:
+                movie_ids = [movie_id for movie_id in movie_ids if (movie_id, actor_id) not in self.removed]
+            extra = self.added_actor_movies.get(actor_id)
+        return sorted(set(movie_ids) | extra) if extra else movie_ids
+
+    def actors_of(self, movie_id: int) -> List[int]:
+        with self._lock:
+            actor_ids = self.movie_actors.get(movie_id).tolist()
+            if self.removed:
+                actor_ids = [actor_id for actor_id in actor_ids if (movie_id, actor_id) not in self.removed]
+            extra = self.added_movie_actors.get(movie_id)
+        return sorted(set(actor_ids) | extra) if extra else actor_ids
+
+
+cast_graph: Optional[CastGraph] = None
+
+
+@catalog_watcher.subscribe
+def refresh_cast_graph():
+    global cast_graph
+    pairs, error = get_cast_pairs_from_db()
+    if error:
+        raise RuntimeError(error)
+    if cast_graph is None:
+        cast_graph = CastGraph(pairs)
+    else:
+        cast_graph.apply(pairs)
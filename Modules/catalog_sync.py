@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from typing import Callable, List
+from dotenv import load_dotenv
+from database.movie_db import get_catalog_fingerprint
+from Helpers.metrics import CallbackGauge
+
+load_dotenv()
+CATALOG_SYNC_INTERVAL_SECONDS = float(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", "300"))
+
+
+class CatalogWatcher:
+    """
+    Polls the catalog fingerprint in a background thread and notifies the
+    in-memory indexes built from the movies tables whenever it changes.
+    """
+
+    def __init__(self, interval: float = CATALOG_SYNC_INTERVAL_SECONDS):
+        self.interval = interval
+        self.fingerprint = None
+        self.version = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, listener: Callable[[], None]):
+        """Register a callback that rebuilds an index after a catalog change"""
+        self._listeners.append(listener)
+        return listener
+
+    def start(self):
+        """Start polling, the first poll runs immediately and builds every index"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+
+    def refresh_now(self):
+        """Ask the watcher to poll without waiting for the next interval"""
+        self._wakeup.set()
+
+    def check(self) -> bool:
+        """Poll once, returns True when listeners were notified"""
+        with self._lock:
+            fingerprint, error = get_catalog_fingerprint()
+            if error:
+                print(f"Error fetching catalog fingerprint: {error}")
+                return False
+
+            if fingerprint == self.fingerprint:
+                return False
+
+            failed = False
+            for listener in self._listeners:
+                name = getattr(listener, "__name__", repr(listener))
+                started = time.perf_counter()
+                try:
+                    listener()
+                except Exception as e:
+                    # Keep the old fingerprint so the next poll retries
+                    print(f"Error refreshing {name}: {e}")
+                    failed = True
+                    continue
+                print(f"Refreshed {name} in {time.perf_counter() - started:.2f}s")
+
+            if failed:
+                return False
+
+            self.fingerprint = fingerprint
+            self.version += 1
+            return True
+
+    def _run(self):
+        while True:
+            self.check()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+
+catalog_watcher = CatalogWatcher()
+
+CallbackGauge(
+    "catalog_version", "Number of catalog changes picked up since start", [],
+    lambda: {(): catalog_watcher.version},
+)
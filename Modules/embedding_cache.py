@@ -0,0 +1,128 @@
+import fcntl
+import hashlib
+import os
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+from Helpers.metrics import ENCODER_SECONDS, Counter
+
+EMBEDDING_CACHE_LOOKUPS = Counter("embedding_cache_lookups_total", "Embedding cache lookups", ["result"])
+
+
+class EmbeddingCache:
+    """
+    Persistent embeddings keyed by a 64-bit hash of the model name and the
+    exact input text, so re-indexing unchanged texts skips the encoder.
+
+    Two append-only files: <model>.keys holds the uint64 keys and
+    <model>.f32 the float32 vectors, row for row. Vectors are read through a
+    memory map and keys are looked up with a binary search over a sorted
+    copy, a few bytes per entry in memory. Rows appended by this process are
+    merged into that copy, rows appended by other processes show up after
+    refresh(). The keys file is written last and
+    decides how many rows are valid, so a crash mid-append loses at most
+    that batch. Appends take a file lock, several workers can share the cache.
+    """
+
+    def __init__(self, directory: str, model_name: str, dimension: int):
+        os.makedirs(directory, exist_ok=True)
+        safe_name = "".join(char if char.isalnum() or char in "-_." else "_" for char in model_name)
+        self.model_name = model_name
+        self.dimension = dimension
+        self.keys_path = os.path.join(directory, f"{safe_name}.keys")
+        self.vectors_path = os.path.join(directory, f"{safe_name}.f32")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the keys, picking up rows appended by other processes"""
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        keys = np.fromfile(self.keys_path, dtype="<u8") if os.path.exists(self.keys_path) else np.zeros(0, dtype="<u8")
+        row_bytes = self.dimension * 4
+        vector_rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        keys = keys[:vector_rows]
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        self._map_vectors(len(keys))
+
+    def _map_vectors(self, rows: int):
+        self._vectors = (
+            np.memmap(self.vectors_path, dtype="<f4", mode="r", shape=(rows, self.dimension))
+            if rows else np.zeros((0, self.dimension), dtype="<f4")
+        )
+
+    def _merge(self, keys: np.ndarray, first_row: int):
+        """Add rows first_row.. with keys to the sorted copy, without re-sorting it"""
+        order = np.argsort(keys, kind="stable")
+        positions = np.searchsorted(self._sorted_keys, keys[order])
+        self._sorted_keys = np.insert(self._sorted_keys, positions, keys[order])
+        self._order = np.insert(self._order, positions, first_row + order)
+        self._map_vectors(first_row + len(keys))
+
+    def key(self, text: str) -> int:
+        digest = hashlib.blake2b(f"{self.model_name}\0{text}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Row of every key, -1 when it is not cached"""
+        if not len(self._sorted_keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_keys, keys), len(self._sorted_keys) - 1)
+        return np.where(self._sorted_keys[positions] == keys, self._order[positions], -1)
+
+    def _append(self, keys: np.ndarray, vectors: np.ndarray) -> int:
+        """Write the rows, returns the row number of the first one"""
+        with open(self.keys_path, "ab") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                # Another process may have appended since we last looked,
+                # align the vectors file with the keys before writing
+                row_bytes = self.dimension * 4
+                valid_rows = os.path.getsize(self.keys_path) // 8
+                with open(self.vectors_path, "ab") as vectors_file:
+                    vectors_file.truncate(min(os.path.getsize(self.vectors_path), valid_rows * row_bytes))
+                    vectors_file.write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+                keys_file.truncate(valid_rows * 8)
+                keys_file.write(keys.astype("<u8").tobytes())
+                return valid_rows
+            finally:
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+    def encode(self, model, texts: List[str]) -> np.ndarray:
+        """Embeddings for texts, only the ones not in the cache go through model.encode"""
+        keys = np.fromiter((self.key(text) for text in texts), dtype=np.uint64, count=len(texts))
+        with self._lock:
+            rows = self._lookup(keys)
+            embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+            cached = rows >= 0
+            embeddings[cached] = self._vectors[rows[cached]]
+
+            # Identical texts in one batch are encoded once
+            missing: Dict[int, List[int]] = {}
+            for position in np.flatnonzero(~cached).tolist():
+                missing.setdefault(int(keys[position]), []).append(position)
+            if missing:
+                positions = [indexes[0] for indexes in missing.values()]
+                with ENCODER_SECONDS.time(operation="add_movies"):
+                    encoded = np.asarray(model.encode([texts[position] for position in positions]), dtype=np.float32)
+                for vector, indexes in zip(encoded, missing.values()):
+                    embeddings[indexes] = vector
+                new_keys = np.array(list(missing), dtype=np.uint64)
+                self._merge(new_keys, self._append(new_keys, encoded))
+
+        hits, misses = int(cached.sum()), len(texts) - int(cached.sum())
+        self.hits += hits
+        self.misses += misses
+        EMBEDDING_CACHE_LOOKUPS.inc(hits, result="hit")
+        EMBEDDING_CACHE_LOOKUPS.inc(misses, result="miss")
+        return embeddings
+
+    def stats(self) -> Tuple[int, int]:
+        return self.hits, self.misses
@@ -0,0 +1,104 @@
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+import numpy as np
+from database.movie_db import get_facet_rows_from_db, get_genre_links_from_db
+from Modules.catalog_sync import catalog_watcher
+
+
+def rating_bucket(rating: Optional[float]) -> str:
+    if rating is None:
+        return "unrated"
+    low = min(max(int(rating), 0), 9)
+    return f"{low}-{low + 1}"
+
+
+def decade_bucket(year: Optional[int]) -> str:
+    return f"{int(year) // 10 * 10}s" if year else "unknown"
+
+
+class FacetIndex:
+    """
+    Bitset index of the catalog for facet counts.
+
+    Every movie gets a dense bit position and every facet value (a genre, a
+    rating bucket, a decade) a Python int with the bits of its movies set.
+    Filters and counts are then big-int AND/OR and bit_count(), a few
+    microseconds each even for hundreds of thousands of movies.
+    """
+
+    def __init__(self, movie_rows, genre_rows):
+        movie_ids = sorted(row["movie_id"] for row in movie_rows)
+        self.movie_ids = np.array(movie_ids, dtype=np.int64)
+        self.positions = {movie_id: position for position, movie_id in enumerate(movie_ids)}
+        self.all = (1 << len(movie_ids)) - 1
+
+        # Bits are set in bytearrays and converted once, setting them on ints would copy each time
+        size = len(movie_ids) // 8 + 1
+        values: Dict[str, Dict[Hashable, bytearray]] = {"genre": {}, "rating": {}, "decade": {}}
+
+        def add(facet: str, value: Hashable, movie_id: int):
+            position = self.positions.get(movie_id)
+            if position is None:
+                return
+            bits = values[facet].get(value)
+            if bits is None:
+                bits = values[facet][value] = bytearray(size)
+            bits[position >> 3] |= 1 << (position & 7)
+
+        for row in movie_rows:
+            add("rating", rating_bucket(row["rating"]), row["movie_id"])
+            add("decade", decade_bucket(row["year"]), row["movie_id"])
+        for row in genre_rows:
+            add("genre", row["genre_id"], row["movie_id"])
+
+        self.facets: Dict[str, Dict[Hashable, int]] = {
+            facet: {value: int.from_bytes(bits, "little") for value, bits in facet_values.items()}
+            for facet, facet_values in values.items()
+        }
+
+    def match(self, filters: Dict[str, Iterable[Hashable]]) -> int:
+        """Bitset of the movies matching every facet filter, values within one facet are OR'ed"""
+        mask = self.all
+        for facet, selected in filters.items():
+            union = 0
+            for value in selected:
+                union |= self.facets.get(facet, {}).get(value, 0)
+            mask &= union
+        return mask
+
+    def page(self, filters: Dict[str, Iterable[Hashable]], page: int, page_size: int) -> Tuple[List[int], int]:
+        """A page of the matching movie ids in movie_id order, and the number of matches"""
+        mask = self.match(filters)
+        bits = np.unpackbits(np.frombuffer(mask.to_bytes(len(self.movie_ids) // 8 + 1, "little"), dtype=np.uint8), bitorder="little")
+        positions = np.flatnonzero(bits)
+        skip = (page - 1) * page_size
+        return self.movie_ids[positions[skip:skip + page_size]].tolist(), len(positions)
+
+    def count(self, filters: Dict[str, Iterable[Hashable]]) -> int:
+        return self.match(filters).bit_count()
+
+    def counts(self, filters: Dict[str, Iterable[Hashable]]) -> Dict[str, Dict[Hashable, int]]:
+        """
+        Non-zero counts per facet value. Each facet is counted with the filters
+        of the other facets only, so a selected genre still shows its siblings
+        """
+        result = {}
+        for facet, facet_values in self.facets.items():
+            mask = self.match({name: selected for name, selected in filters.items() if name != facet})
+            counts = {value: (mask & bits).bit_count() for value, bits in facet_values.items()}
+            result[facet] = {value: count for value, count in counts.items() if count}
+        return result
+
+
+facet_index: Optional[FacetIndex] = None
+
+
+@catalog_watcher.subscribe
+def rebuild_facet_index():
+    global facet_index
+    movie_rows, error = get_facet_rows_from_db()
+    if error:
+        raise RuntimeError(error)
+    genre_rows, error = get_genre_links_from_db()
+    if error:
+        raise RuntimeError(error)
+    facet_index = FacetIndex(movie_rows, genre_rows)
@@ -1,116 +1,279 @@
 import faiss
 import numpy as np
+import hashlib
 import json
+import threading
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Tuple
 import os
 from dotenv import load_dotenv
-from database.movie_db import get_movie_by_id_from_db
+from Helpers.loaders import request_loaders
 from Modules.movies import format_movie_data
+from Helpers.metrics import ENCODER_SECONDS, FAISS_SEARCH_SECONDS
+from Helpers.single_flight import flights
+from Helpers.keys import normalize_query
+from Modules.embedding_cache import EmbeddingCache
 
 load_dotenv()
 POSTER_PATH_URL = os.getenv("POSTER_PATH_URL")
+# "fake" swaps the sentence transformer for the deterministic load-test encoder
+VECTOR_ENCODER = os.getenv("VECTOR_ENCODER", "sentence-transformers")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", ".")
+INDEX_PATH = os.path.join(VECTOR_STORE_DIR, "movie_embeddings.index")
+STATE_PATH = os.path.join(VECTOR_STORE_DIR, "movie_vector_store.json")
+# Version 1 kept a positional movie_ids list next to a plain IndexFlatL2
+STATE_VERSION = 2
+# Movies encoded and added per step, bounds the embedding buffer on big syncs
+ENCODE_CHUNK_SIZE = int(os.getenv("VECTOR_ENCODE_CHUNK_SIZE", "1024"))
+# Embeddings of movie texts persist here across rebuilds, keyed by model and text
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(VECTOR_STORE_DIR, "embedding_cache"))
+MODEL_NAME = "fake-encoder" if VECTOR_ENCODER == "fake" else "all-MiniLM-L6-v2"
+
+def load_encoder():
+    if VECTOR_ENCODER == "fake":
+        from loadtest.fake_encoder import FakeEncoder
+        return FakeEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+def document_text(movie: Dict) -> str:
+    """The text embedded for a movie"""
+    return f"{movie.get('title') or ''} {movie.get('description') or ''}"
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def movie_id_of(movie: Dict) -> int:
+    movie_id = movie.get("movie_id", movie.get("id"))
+    if movie_id is None:
+        raise ValueError(f"Movie {movie.get('title')!r} has no movie_id")
+    return int(movie_id)
 
 class HybridVectorStore:
+    """
+    FAISS index of movie embeddings keyed by movie_id.
+
+    Vectors live in an IndexIDMap2, so a movie is upserted or deleted by id
+    and the index holds exactly one vector per movie. The metadata keeps the
+    hash of the embedded text, which lets sync() re-encode only the movies
+    whose title or description changed.
+    """
+
     def __init__(self):
         # Initialize the embedding model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.model = load_encoder()
         
         # Initialize FAISS index
         self.dimension = 384  # dimension of all-MiniLM-L6-v2
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index = self.new_index()
+        self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, MODEL_NAME, self.dimension)
         
-        # Store movie metadata and mapping
-        self.movie_ids = []  # Maps FAISS indices to movie IDs
-        self.movie_metadata = {}  # Stores movie details
+        # movie_id -> movie details plus the hash of the embedded text
+        self.movie_metadata: Dict[int, Dict] = {}
+        # Searches and updates share the index, FAISS is not safe to read while it is modified
+        self._lock = threading.RLock()
         
         # Load existing data if available
         self.load_state()
+
+    def new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+
+    def __len__(self):
+        return self.index.ntotal
     
     def add_movies(self, movies: List[Dict]):
-        """Add movies to the vector store"""
-        # Prepare texts for embedding
-        texts = [f"{m['title']} {m.get('description', '')}" for m in movies]
-        
-        # Generate embeddings
-        embeddings = self.model.encode(texts)
-        
-        # Add to FAISS index
-        self.index.add(embeddings.astype('float32'))
-        
-        # Store metadata
-        for i, movie in enumerate(movies):
-            movie_id = movie.get('id', str(len(self.movie_ids)))
-            self.movie_ids.append(movie_id)
-            self.movie_metadata[movie_id] = movie
-        
-        # Save state
-        self.save_state()
+        """Add or replace movies in the vector store"""
+        return self.upsert_movies(movies)
+
+    def upsert_movies(self, movies: Iterable[Dict], save: bool = True) -> int:
+        """
+        Insert or replace movies by movie_id, returns how many were re-embedded
+        (from the embedding cache or the encoder). Movies whose embedded text
+        did not change only get their metadata updated.
+        """
+        latest = {movie_id_of(movie): movie for movie in movies}
+        hashes = {movie_id: text_hash(document_text(movie)) for movie_id, movie in latest.items()}
+        changed = [movie_id for movie_id, digest in hashes.items()
+                   if self.movie_metadata.get(movie_id, {}).get("text_hash") != digest]
+
+        for start in range(0, len(changed), ENCODE_CHUNK_SIZE):
+            chunk = changed[start:start + ENCODE_CHUNK_SIZE]
+            # Generate embeddings, texts embedded before by this model come from the cache
+            embeddings = self.embedding_cache.encode(self.model, [document_text(latest[movie_id]) for movie_id in chunk])
+            ids = np.array(chunk, dtype="int64")
+            with self._lock:
+                self.index.remove_ids(ids)
+                self.index.add_with_ids(embeddings.astype('float32'), ids)
+
+        with self._lock:
+            for movie_id, movie in latest.items():
+                self.movie_metadata[movie_id] = {**movie, "movie_id": movie_id, "text_hash": hashes[movie_id]}
+            if save:
+                self.save_state()
+        return len(changed)
+
+    def delete_movies(self, movie_ids: Iterable[int], save: bool = True) -> int:
+        """Remove movies by movie_id, returns how many were in the index"""
+        with self._lock:
+            ids = np.array([movie_id for movie_id in set(movie_ids) if movie_id in self.movie_metadata], dtype="int64")
+            removed = self.index.remove_ids(ids) if len(ids) else 0
+            for movie_id in ids.tolist():
+                del self.movie_metadata[movie_id]
+            if save and len(ids):
+                self.save_state()
+        return removed
+
+    def sync(self, movies: List[Dict]) -> Dict:
+        """
+        Make the index match movies exactly: encode new and changed movies
+        and delete the ones that are gone
+        """
+        current = {movie_id_of(movie): movie for movie in movies}
+        with self._lock:
+            gone = [movie_id for movie_id in self.movie_metadata if movie_id not in current]
+        # Pick up embeddings other workers cached since this one last looked
+        self.embedding_cache.refresh()
+        hits, misses = self.embedding_cache.stats()
+        embedded = self.upsert_movies(current.values(), save=False)
+        deleted = self.delete_movies(gone, save=False)
+        with self._lock:
+            self.save_state()
+        cache_hits, cache_misses = (now - before for now, before in zip(self.embedding_cache.stats(), (hits, misses)))
+        return {
+            "catalog": len(current),
+            "embedded": embedded,
+            "embedding_cache_hits": cache_hits,
+            "encoded": cache_misses,
+            "deleted": deleted,
+            "indexed": len(self),
+        }
     
-    def search(self, query: str, k: int = 5) -> List[Dict]:
-        """Search for similar movies"""
+    def nearest(self, query: str, k: int) -> List[Tuple[Dict, float]]:
+        """Metadata and L2 distance of the k movies closest to query"""
         # Generate query embedding
-        query_embedding = self.model.encode([query])
+        with ENCODER_SECONDS.time(operation="search"):
+            query_embedding = self.model.encode([query])
         
         # Search in FAISS
-        distances, indices = self.index.search(
-            query_embedding.astype('float32'), 
-            k
-        )
+        with self._lock, FAISS_SEARCH_SECONDS.time():
+            distances, labels = self.index.search(
+                query_embedding.astype('float32'), 
+                k
+            )
+            hits = [(self.movie_metadata.get(int(label)), float(distance))
+                    for label, distance in zip(labels[0], distances[0]) if label != -1]
+        return [(metadata, distance) for metadata, distance in hits if metadata is not None]
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """Search for similar movies"""
+        # Identical searches in flight share one encoder pass and index scan.
+        # The model is uncased, so case and spacing do not change the embedding
+        query = normalize_query(query)
+        hits = flights.do(("vector_search", id(self), query, k), self.nearest, query, k)
         
+        # Hydrate every hit with one batched lookup, memoized for the rest of the request
+        movies, error = request_loaders().movies.load_many(metadata["movie_id"] for metadata, _ in hits)
+        if error:
+            print(f"Error fetching movies for vector search: {error}")
+        movies_by_id = {movie.movie_id: movie for movie in movies}
+
         # Get results with metadata
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.movie_ids):
-                movie_id = self.movie_ids[idx]
-                movie_data = self.movie_metadata.get(movie_id, {})
-             
-                data, error = get_movie_by_id_from_db(movie_data.get("movie_id"))
-                if data:
-                    movie_data = format_movie_data(data)
-                movie_data['similarity_score'] = float(1 / (1 + distances[0][i]))
-
-                if movie_data.get("description"):
-                    movie_data["overview"] = movie_data["description"]
-                results.append(movie_data)
+        for metadata, distance in hits:
+            movie_data = {key: value for key, value in metadata.items() if key != "text_hash"}
+
+            data = movies_by_id.get(metadata["movie_id"])
+            if data:
+                movie_data = format_movie_data(data)
+            movie_data['similarity_score'] = float(1 / (1 + distance))
+
+            if movie_data.get("description"):
+                movie_data["overview"] = movie_data["description"]
+            results.append(movie_data)
         
         return results
     
     def save_state(self):
         """Save the current state to disk"""
+        # Write to temporary files and rename them into place, so workers
+        # reloading concurrently never read a half written file
         # Save FAISS index
-        faiss.write_index(self.index, "movie_embeddings.index")
+        faiss.write_index(self.index, INDEX_PATH + ".tmp")
+        os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
         
         # Save metadata
         state = {
-            'movie_ids': self.movie_ids,
+            'version': STATE_VERSION,
             'movie_metadata': self.movie_metadata,
             'last_updated': datetime.now().isoformat()
         }
         
-        with open("movie_vector_store.json", "w") as f:
+        with open(STATE_PATH + ".tmp", "w") as f:
             json.dump(state, f)
+        os.replace(STATE_PATH + ".tmp", STATE_PATH)
     
+    def read_state(self):
+        """
+        Read the index and metadata saved on disk, empty when there is none.
+        Returns (index, metadata, migrated)
+        """
+        if not (os.path.exists(INDEX_PATH) and os.path.exists(STATE_PATH)):
+            return self.new_index(), {}, False
+        index = faiss.read_index(INDEX_PATH)
+        with open(STATE_PATH, "r") as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            return index, {int(movie_id): metadata for movie_id, metadata in state['movie_metadata'].items()}, False
+        return (*self.migrate_state(index, state), True)
+
+    def migrate_state(self, old_index, state: Dict):
+        """
+        Convert a version 1 state: vectors are looked up by their position in
+        movie_ids and re-keyed by movie_id, a re-uploaded movie keeps its
+        latest vector and entries without a movie id are dropped
+        """
+        positions: Dict[int, int] = {}
+        metadata: Dict[int, Dict] = {}
+        for position, key in enumerate(state['movie_ids'][:old_index.ntotal]):
+            movie = state['movie_metadata'].get(str(key))
+            try:
+                movie_id = movie_id_of(movie)
+            except (AttributeError, TypeError, ValueError):
+                continue
+            positions[movie_id] = position
+            metadata[movie_id] = {**movie, "movie_id": movie_id}
+            if movie.get("title") is not None:
+                metadata[movie_id]["text_hash"] = text_hash(document_text(movie))
+
+        index = self.new_index()
+        if positions:
+            vectors = old_index.reconstruct_n(0, old_index.ntotal)
+            index.add_with_ids(vectors[list(positions.values())], np.array(list(positions), dtype="int64"))
+        print(f"Migrated vector store: {old_index.ntotal} vectors to {index.ntotal} movies")
+        return index, metadata
+
     def load_state(self):
         """Load state from disk"""
         try:
-            # Only load if files exist
-            if os.path.exists("movie_embeddings.index") and os.path.exists("movie_vector_store.json"):
-                # Load FAISS index
-                self.index = faiss.read_index("movie_embeddings.index")
-                # Load metadata
-                with open("movie_vector_store.json", "r") as f:
-                    state = json.load(f)
-                    self.movie_ids = state['movie_ids']
-                    self.movie_metadata = state['movie_metadata']
-            else:
-                # Initialize new if no saved state
-                self.index = faiss.IndexFlatL2(self.dimension)
-                self.movie_ids = []
-                self.movie_metadata = {}
+            self.index, self.movie_metadata, migrated = self.read_state()
+            if migrated:
+                self.save_state()
         except Exception as e:
             # On any error, reinitialize
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.movie_ids = []
-            self.movie_metadata = {} 
\ No newline at end of file
+            print(f"Error loading vector store: {e}")
+            self.index = self.new_index()
+            self.movie_metadata = {}
+
+    def reload(self):
+        """Swap in the state saved on disk, e.g. after another worker uploaded movies"""
+        try:
+            index, movie_metadata, _ = self.read_state()
+        except Exception as e:
+            # Keep serving the current index
+            print(f"Error reloading vector store: {e}")
+            return False
+        with self._lock:
+            self.index, self.movie_metadata = index, movie_metadata
+        print(f"Reloaded vector store with {len(movie_metadata)} movies")
+        return True
@@ -0,0 +1,129 @@
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from database.movie_db import get_genre_links_from_db, get_leaderboard_movies_from_db
+from Modules.catalog_sync import catalog_watcher
+
+GLOBAL_BOARD = None
+
+
+def leaderboard_key(row: Dict) -> tuple:
+    """
+    Sort key matching get_top_n_movies: rating, release date and revenue
+    descending with NULLs last, movie_id keeps the order total
+    """
+    return (
+        row["rating"] is None, -(row["rating"] or 0),
+        row["release_day"] is None, -int(row["release_day"] or 0),
+        row["revenue"] is None, -int(row["revenue"] or 0),
+        row["movie_id"],
+    )
+
+
+class Leaderboards:
+    """
+    Precomputed top-N lists, one global and one per genre.
+
+    Each board is a compact array of movie ids kept sorted by leaderboard_key,
+    so a top-N read is a slice. Only ids and sort keys are held, readers
+    hydrate the movies they return. Refreshes diff the catalog against the
+    stored keys and only move the movies whose rating, release date, revenue
+    or genres changed.
+    """
+
+    def __init__(self):
+        self.keys: Dict[int, tuple] = {}
+        self.genres: Dict[int, frozenset] = {}
+        self.boards: Dict[Optional[int], array] = {GLOBAL_BOARD: array("q")}
+        self._lock = threading.Lock()
+
+    def _insert(self, board_id: Optional[int], movie_id: int):
+        board = self.boards.setdefault(board_id, array("q"))
+        key = self.keys[movie_id]
+        board.insert(bisect_left(board, key, key=self.keys.__getitem__), movie_id)
+
+    def _remove(self, board_id: Optional[int], movie_id: int):
+        board = self.boards[board_id]
+        position = bisect_left(board, self.keys[movie_id], key=self.keys.__getitem__)
+        if position < len(board) and board[position] == movie_id:
+            del board[position]
+
+    def _boards_for(self, movie_id: int):
+        return (GLOBAL_BOARD, *self.genres.get(movie_id, ()))
+
+    def refresh(self, rows, genre_rows) -> int:
+        """Apply the current catalog, returns how many movies moved"""
+        genres: Dict[int, set] = {}
+        for row in genre_rows:
+            genres.setdefault(row["movie_id"], set()).add(row["genre_id"])
+
+        # Only movies with revenue are ranked, like the original query
+        current = {row["movie_id"]: row for row in rows if row["revenue"] and int(row["revenue"]) > 0}
+        changed = 0
+
+        with self._lock:
+            if not self.keys:
+                return self._build(current, genres)
+
+            for movie_id in list(self.keys):
+                if movie_id not in current:
+                    for board_id in self._boards_for(movie_id):
+                        self._remove(board_id, movie_id)
+                    del self.keys[movie_id]
+                    self.genres.pop(movie_id, None)
+                    changed += 1
+
+            for movie_id, row in current.items():
+                key = leaderboard_key(row)
+                movie_genres = frozenset(genres.get(movie_id, ()))
+                if self.keys.get(movie_id) == key and self.genres.get(movie_id) == movie_genres:
+                    continue
+
+                if movie_id in self.keys:
+                    for board_id in self._boards_for(movie_id):
+                        self._remove(board_id, movie_id)
+                self.keys[movie_id] = key
+                self.genres[movie_id] = movie_genres
+                for board_id in self._boards_for(movie_id):
+                    self._insert(board_id, movie_id)
+                changed += 1
+
+        return changed
+
+    def _build(self, current: Dict[int, Dict], genres: Dict[int, set]) -> int:
+        members: Dict[Optional[int], list] = {GLOBAL_BOARD: []}
+        for movie_id, row in current.items():
+            self.keys[movie_id] = leaderboard_key(row)
+            self.genres[movie_id] = frozenset(genres.get(movie_id, ()))
+            for board_id in self._boards_for(movie_id):
+                members.setdefault(board_id, []).append(movie_id)
+
+        self.boards = {
+            board_id: array("q", sorted(movie_ids, key=self.keys.__getitem__))
+            for board_id, movie_ids in members.items()
+        }
+        return len(current)
+
+    def top(self, n: int, genre_id: Optional[int] = None) -> Tuple[List[int], int]:
+        """Ids of the top n movies of a board and the size of the board"""
+        with self._lock:
+            board = self.boards.get(genre_id if genre_id else GLOBAL_BOARD, array("q"))
+            return board[:n].tolist(), len(board)
+
+
+leaderboards = Leaderboards()
+leaderboards_ready = False
+
+
+@catalog_watcher.subscribe
+def refresh_leaderboards():
+    global leaderboards_ready
+    rows, error = get_leaderboard_movies_from_db()
+    if error:
+        raise RuntimeError(error)
+    genre_rows, error = get_genre_links_from_db()
+    if error:
+        raise RuntimeError(error)
+    leaderboards.refresh(rows, genre_rows)
+    leaderboards_ready = True
@@ -0,0 +1,194 @@
+"""
+Denormalized movie read model.
+
+    python -m Modules.movie_snapshot        # build MOVIE_SNAPSHOT_PATH once
+
+Every movie is stored exactly as format_movie_data returns it, as JSON, in
+one memory-mapped file. Reads are a binary search over the id array and a
+slice of the map, with no joins and no Prisma models. Workers mapping the
+same file share it through the page cache.
+
+File layout, little endian, index arrays are 8 byte aligned:
+
+    header      magic, catalog digest, movie count, genre count, genre
+                link count, offset of the index section
+    documents   the JSON documents back to back
+    index       ids int64[n]                      sorted movie ids
+                offsets int64[n + 1]              document bounds
+                genre_ids int64[g]
+                genre_starts int64[g + 1]         bounds into genre_members
+                genre_members int64[links]        movie ids per genre, sorted
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from database.movie_db import get_catalog_fingerprint, get_movies_after_from_db
+from Modules.catalog_sync import catalog_watcher
+
+load_dotenv()
+MOVIE_SNAPSHOT_PATH = os.getenv("MOVIE_SNAPSHOT_PATH", "movie_snapshot.bin")
+# Poster URLs are baked into the documents, a new base URL needs a new snapshot
+POSTER_PATH_URL = os.getenv("POSTER_PATH_URL")
+SNAPSHOT_CHUNK_SIZE = 1000
+
+MAGIC = b"MOVSNAP1"
+HEADER = struct.Struct("<8s16sQQQQ")
+
+
+def catalog_digest(fingerprint) -> bytes:
+    """Digest of the catalog and of the config baked into the documents"""
+    return hashlib.blake2b(repr((fingerprint, POSTER_PATH_URL)).encode(), digest_size=16).digest()
+
+
+class MovieSnapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.digest, count, genre_count, links, index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a movie snapshot")
+
+        def section(length: int):
+            nonlocal index_offset
+            values = np.frombuffer(self._map, dtype="<i8", count=length, offset=index_offset)
+            index_offset += length * 8
+            return values
+
+        self.ids = section(count)
+        self.offsets = section(count + 1)
+        self.genre_ids = section(genre_count)
+        self.genre_starts = section(genre_count + 1)
+        self.genre_members = section(links)
+        self.genres = {int(genre_id): position for position, genre_id in enumerate(self.genre_ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _document(self, position: int) -> Dict:
+        start = HEADER.size + int(self.offsets[position])
+        end = HEADER.size + int(self.offsets[position + 1])
+        return json.loads(self._map[start:end])
+
+    def get(self, movie_id: int) -> Optional[Dict]:
+        """The formatted movie, None when it is not in the catalog"""
+        position = int(np.searchsorted(self.ids, movie_id))
+        if position < len(self.ids) and self.ids[position] == movie_id:
+            return self._document(position)
+        return None
+
+    def get_many(self, movie_ids: List[int]) -> List[Dict]:
+        """Formatted movies in the order of movie_ids, missing ones skipped"""
+        documents = (self.get(movie_id) for movie_id in movie_ids)
+        return [document for document in documents if document is not None]
+
+    def page(self, page: int, page_size: int, genre_id: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """A page of movies in movie_id order, like the unordered list queries, and the total"""
+        skip = (page - 1) * page_size
+        if not genre_id:
+            end = min(skip + page_size, len(self.ids))
+            return [self._document(position) for position in range(skip, end)], len(self.ids)
+
+        position = self.genres.get(genre_id)
+        if position is None:
+            return [], 0
+        members = self.genre_members[self.genre_starts[position]:self.genre_starts[position + 1]]
+        return self.get_many(members[skip:skip + page_size].tolist()), len(members)
+
+
+def build_snapshot(path: str, fingerprint) -> int:
+    """
+    Write the snapshot for the current catalog next to path and rename it into
+    place, returns the number of movies. Movies are read in keyset chunks so
+    only the id and genre arrays grow with the catalog.
+    """
+    # Imported here, Modules.movies serves from this module
+    from Modules.movies import format_movie_data
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    ids, offsets = array("q"), array("q", [0])
+    genre_members: Dict[int, array] = {}
+    cursor = 0
+
+    with open(temporary, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        while True:
+            movies, error = get_movies_after_from_db(cursor, SNAPSHOT_CHUNK_SIZE)
+            if error:
+                f.close()
+                os.remove(temporary)
+                raise RuntimeError(error)
+
+            for movie in movies:
+                document = json.dumps(format_movie_data(movie), separators=(",", ":"), default=str).encode("utf-8")
+                f.write(document)
+                ids.append(movie.movie_id)
+                offsets.append(offsets[-1] + len(document))
+                for genre_relation in movie.movie_genres or []:
+                    genre_members.setdefault(genre_relation.genre_id, array("q")).append(movie.movie_id)
+
+            if len(movies) < SNAPSHOT_CHUNK_SIZE:
+                break
+            cursor = movies[-1].movie_id
+
+        f.write(b"\0" * (-f.tell() % 8))
+        index_offset = f.tell()
+        genre_ids = sorted(genre_members)
+        genre_starts = array("q", [0])
+        for genre_id in genre_ids:
+            genre_starts.append(genre_starts[-1] + len(genre_members[genre_id]))
+        for values in (ids, offsets, array("q", genre_ids), genre_starts, *(genre_members[genre_id] for genre_id in genre_ids)):
+            f.write(np.asarray(values, dtype="<i8").tobytes())
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, catalog_digest(fingerprint), len(ids), len(genre_ids), genre_starts[-1], index_offset))
+
+    os.replace(temporary, path)
+    return len(ids)
+
+
+movie_snapshot: Optional[MovieSnapshot] = None
+
+
+@catalog_watcher.subscribe
+def refresh_movie_snapshot():
+    """Map the snapshot of the current catalog, building it unless another worker already did"""
+    global movie_snapshot
+    fingerprint, error = get_catalog_fingerprint()
+    if error:
+        raise RuntimeError(error)
+    digest = catalog_digest(fingerprint)
+    if movie_snapshot is not None and movie_snapshot.digest == digest:
+        return
+
+    snapshot = None
+    if os.path.exists(MOVIE_SNAPSHOT_PATH):
+        try:
+            snapshot = MovieSnapshot(MOVIE_SNAPSHOT_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable movie snapshot: {e}")
+    if snapshot is None or snapshot.digest != digest:
+        build_snapshot(MOVIE_SNAPSHOT_PATH, fingerprint)
+        snapshot = MovieSnapshot(MOVIE_SNAPSHOT_PATH)
+
+    # Readers holding the previous snapshot keep their own map until they finish
+    movie_snapshot = snapshot
+
+
+if __name__ == "__main__":
+    from prisma import Prisma, register
+
+    db = Prisma(datasource={"url": os.environ["DATABASE_URL"]}) if os.getenv("DATABASE_URL") else Prisma()
+    db.connect()
+    register(db)
+    fingerprint, error = get_catalog_fingerprint()
+    if error:
+        raise SystemExit(error)
+    print(f"Wrote {build_snapshot(MOVIE_SNAPSHOT_PATH, fingerprint)} movies to {MOVIE_SNAPSHOT_PATH}")
+    db.disconnect()
@@ -1,27 +1,38 @@
-from fastapi import APIRouter, Query, Depends
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Query, Depends, Request
+from Helpers.profiling import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import Optional
 from Models.movie_list_models import MovieListResponse, MovieDetailResponse
 from database.movie_db import (
     get_all_movies_from_db, 
-    get_movie_by_id_from_db, 
     get_movies_by_genre_from_db,
     get_favorites_movies,
     get_all_genres_from_db,
-    get_top_n_movies
+    get_top_n_movies,
+    get_movies_after_from_db
 )
 from Helpers.custom_response import unified_response
+from Helpers.http_cache import catalog_cache
+from Helpers.loaders import request_loaders
+from Helpers.metrics import SERIALIZATION_SECONDS, timed
+from Helpers.trending import trending_movies
+import json
 import os
+import zlib
 from dotenv import load_dotenv
 
-from database.user_activity_db import add_search_history, search_movies
+from database.user_activity_db import add_search_history
 from Modules.authentication import get_current_user
+from Modules.title_search import search_titles
+from Modules.suggest import suggest
+from Modules import facets, leaderboards, movie_snapshot
 # Get the project root directory (2 levels up from this file)
 load_dotenv()
 POSTER_PATH_URL = os.getenv("POSTER_PATH_URL")
 
 movies = APIRouter(prefix="/movie", tags=["Movies"])
 
+@timed(SERIALIZATION_SECONDS, function="format_movie_data")
 def format_movie_data(movie_data):
     if not movie_data:
         return None
@@ -71,22 +82,48 @@ async def get_all_movies(
     page_size: int = Query(10, ge=1, le=100, description="Number of movies per page"),
     genre_id: Optional[int] = Query(None, description="Filter by genre ID"),
     top_n_movies: Optional[int] = Query(None, description="Filter by top N movies"),
+    rating: Optional[str] = Query(None, pattern=r"^(\d-\d{1,2}|unrated)$", description="Filter by rating bucket, e.g. 7-8"),
+    decade: Optional[str] = Query(None, pattern=r"^(\d{4}s|unknown)$", description="Filter by release decade, e.g. 1990s"),
+    include_facets: bool = Query(False, alias="facets", description="Include movie counts per genre, rating and decade"),
 ):
-    movies_data, total_count, error = get_all_movies_from_db(
-        page=page, 
-        page_size=page_size, 
-        genre_id=genre_id, 
-        top_n_movies=top_n_movies
-    )
-    
-    if error:
-        return unified_response(False, f"Error fetching movies: {error}", status_code=500)
-    
-    formatted_movies = []
-    for movie in movies_data:
-        formatted_movie = format_movie_data(movie)
-        if formatted_movie:
-            formatted_movies.append(formatted_movie)
+    filters = {
+        facet: [value]
+        for facet, value in (("genre", genre_id), ("rating", rating), ("decade", decade))
+        if value
+    }
+    snapshot = movie_snapshot.movie_snapshot
+    index = facets.facet_index
+    if (rating or decade) and index is not None:
+        # Intersected in the bitset index, then hydrated by id
+        movie_ids, total_count = index.page(filters, page, page_size)
+        if snapshot is not None:
+            formatted_movies = snapshot.get_many(movie_ids)
+        else:
+            movies_data, error = await run_in_threadpool(request_loaders().movies.load_many, movie_ids)
+            if error:
+                return unified_response(False, f"Error fetching movies: {error}", status_code=500)
+            formatted_movies = [format_movie_data(movie) for movie in movies_data]
+    elif snapshot is not None and not (rating or decade):
+        # Already formatted documents, no joins
+        formatted_movies, total_count = snapshot.page(page, page_size, genre_id)
+    else:
+        movies_data, total_count, error = get_all_movies_from_db(
+            page=page, 
+            page_size=page_size, 
+            genre_id=genre_id, 
+            top_n_movies=top_n_movies,
+            rating=rating,
+            decade=decade
+        )
+        
+        if error:
+            return unified_response(False, f"Error fetching movies: {error}", status_code=500)
+        
+        formatted_movies = []
+        for movie in movies_data:
+            formatted_movie = format_movie_data(movie)
+            if formatted_movie:
+                formatted_movies.append(formatted_movie)
     
     response_data = {
         "movies": formatted_movies,
@@ -94,6 +131,10 @@ async def get_all_movies(
         "page": page,
         "page_size": page_size
     }
+
+    # Counts come from the in-memory bitsets, they are left out until it is built
+    if include_facets and index is not None:
+        response_data["facets"] = index.counts(filters)
     
     return unified_response(True, "Movies fetched successfully", data=response_data)
 
@@ -109,7 +150,11 @@ def filter_movies_endpoint(
     """Filter movies by genre ID or top N movies"""
     movies_data = []
 
-    if top_n_movies:
+    if top_n_movies and leaderboards.leaderboards_ready:
+        movie_ids, total_count = leaderboards.leaderboards.top(top_n_movies, genre_id)
+        movies_data, error = request_loaders().movies.load_many(movie_ids)
+
+    elif top_n_movies:
         movies_data, total_count, error = get_top_n_movies(
             n=top_n_movies, genre_id=genre_id
         )
@@ -140,7 +185,7 @@ def filter_movies_endpoint(
 
 @movies.get("/search")
 def search_movies_endpoint(query: str, current_user: dict = Depends(get_current_user)):
-    movies, error = search_movies(query)
+    movies, error = search_titles(query)
     if error:
         return unified_response(False, f"Error searching movies: {error}", status_code=500)
     
@@ -154,42 +199,115 @@ def search_movies_endpoint(query: str, current_user: dict = Depends(get_current_
 
     return unified_response(True, "Search completed successfully", data=movies_res)
 
+@movies.get("/suggest")
+async def suggest_endpoint(
+    query: str = Query(..., min_length=1, description="Text typed so far"),
+    limit: int = Query(10, ge=1, le=20, description="Number of suggestions"),
+):
+    """Typeahead over movie titles, actor names and genre names, served from memory"""
+    return unified_response(True, "Suggestions fetched successfully", data={"suggestions": suggest(query, limit)})
+
+@movies.get("/trending")
+def get_trending_movies(limit: int = Query(10, ge=1, le=50, description="Number of movies")):
+    """Most favorited movies over the trending window, from an in-process sketch"""
+    ranked = trending_movies.top(limit)
+    snapshot = movie_snapshot.movie_snapshot
+    if snapshot is not None:
+        documents = {movie["movie_id"]: movie for movie in snapshot.get_many([movie_id for movie_id, _ in ranked])}
+    else:
+        movies_data, error = request_loaders().movies.load_many(movie_id for movie_id, _ in ranked)
+        if error:
+            return unified_response(False, f"Error fetching trending movies: {error}", status_code=500)
+        documents = {movie.movie_id: format_movie_data(movie) for movie in movies_data}
+
+    trending = [{**documents[movie_id], "trend_score": count} for movie_id, count in ranked if movie_id in documents]
+    return unified_response(True, "Trending movies fetched successfully", data={"movies": trending})
+
+def export_movie_lines(cursor: int, chunk_size: int):
+    """
+    One formatted movie per line in movie_id order, fetched chunk_size at a
+    time so memory stays flat. A failure mid-stream ends with an error line
+    carrying the cursor to resume from.
+    """
+    while True:
+        movies_data, error = get_movies_after_from_db(cursor, chunk_size)
+        if error:
+            yield json.dumps({"error": error, "cursor": cursor}) + "\n"
+            return
+
+        yield "".join(json.dumps(format_movie_data(movie), default=str) + "\n" for movie in movies_data)
+        if len(movies_data) < chunk_size:
+            return
+        cursor = movies_data[-1].movie_id
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        # Sync flush so every chunk reaches the client as soon as it is encoded
+        yield compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+@movies.get("/export")
+def export_movies(
+    request: Request,
+    cursor: int = Query(0, ge=0, description="Resume after this movie_id, the last one received"),
+    chunk_size: int = Query(500, ge=1, le=5000, description="Movies fetched per query")
+):
+    """Stream the whole catalog with cast and genres as NDJSON, gzipped when the client accepts it"""
+    lines = export_movie_lines(cursor, chunk_size)
+    headers = {"Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        lines = gzip_chunks(lines)
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
 @movies.get("/{movie_id}", response_model=MovieDetailResponse)
-async def get_movie_by_id(movie_id: int):
+async def get_movie_by_id(movie_id: int, cache_headers: dict = Depends(catalog_cache("movie"))):
     """Get detailed information about a specific movie"""
-    movie_data, error = get_movie_by_id_from_db(movie_id)
-    
-    if error:
-        return unified_response(False, f"Error fetching movie: {error}", status_code=500)
+    snapshot = movie_snapshot.movie_snapshot
+    if snapshot is not None:
+        formatted_movie = snapshot.get(movie_id)
+    else:
+        # In the threadpool, so identical concurrent lookups can coalesce
+        movie_data, error = await run_in_threadpool(request_loaders().movies.load, movie_id)
+        
+        if error:
+            return unified_response(False, f"Error fetching movie: {error}", status_code=500)
+        
+        formatted_movie = format_movie_data(movie_data)
     
-    if not movie_data:
+    if not formatted_movie:
         return unified_response(False, "Movie not found", status_code=404)
     
-    formatted_movie = format_movie_data(movie_data)
-    
-    return unified_response(True, "Movie details fetched successfully", data={"movie": formatted_movie})
+    return unified_response(True, "Movie details fetched successfully", data={"movie": formatted_movie}, headers=cache_headers)
 
 @movies.get("/genre/{genre_id}")
 async def get_movies_by_genre(
     genre_id: int,
     page: int = Query(1, ge=1, description="Page number"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of movies per page")
+    page_size: int = Query(10, ge=1, le=100, description="Number of movies per page"),
+    cache_headers: dict = Depends(catalog_cache("genre_movies"))
 ):
     """Get movies filtered by genre"""
-    movies_data, total_count, error = get_movies_by_genre_from_db(
-        genre_id=genre_id,
-        page=page,
-        page_size=page_size
-    )
-    
-    if error:
-        return unified_response(False, f"Error fetching movies by genre: {error}", status_code=500)
-    
-    formatted_movies = []
-    for movie in movies_data:
-        formatted_movie = format_movie_data(movie)
-        if formatted_movie:
-            formatted_movies.append(formatted_movie)
+    snapshot = movie_snapshot.movie_snapshot
+    if snapshot is not None:
+        formatted_movies, total_count = snapshot.page(page, page_size, genre_id)
+    else:
+        movies_data, total_count, error = await run_in_threadpool(
+            get_movies_by_genre_from_db,
+            genre_id=genre_id,
+            page=page,
+            page_size=page_size
+        )
+        
+        if error:
+            return unified_response(False, f"Error fetching movies by genre: {error}", status_code=500)
+        
+        formatted_movies = []
+        for movie in movies_data:
+            formatted_movie = format_movie_data(movie)
+            if formatted_movie:
+                formatted_movies.append(formatted_movie)
     
     response_data = {
         "movies": formatted_movies,
@@ -199,10 +317,10 @@ async def get_movies_by_genre(
         "genre_id": genre_id,
     }
     
-    return unified_response(True, f"Movies for genre {genre_id} fetched successfully", data=response_data)
+    return unified_response(True, f"Movies for genre {genre_id} fetched successfully", data=response_data, headers=cache_headers)
 
 @movies.get("/genres/all")
-async def get_all_genres():
+async def get_all_genres(cache_headers: dict = Depends(catalog_cache("genres"))):
     """Get all available genres"""
     genres_data, error = get_all_genres_from_db()
     
@@ -217,4 +335,4 @@ async def get_all_genres():
             "genre_poster":POSTER_PATH_URL+"/genres/"+str(genre.genre_name)+".gif"
         })
     
-    return unified_response(True, "Genres fetched successfully", data={"genres": formatted_genres})
+    return unified_response(True, "Genres fetched successfully", data={"genres": formatted_genres}, headers=cache_headers)
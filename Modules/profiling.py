@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from Helpers.custom_response import unified_response
+from Helpers.profiling import PROFILE_TOKEN, collapsed_stacks, get_profile, list_profiles
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    if not PROFILE_TOKEN or x_profile_token != PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+profiling = APIRouter(prefix="/debug/profiles", tags=["Debug"], dependencies=[Depends(require_profile_token)])
+
+@profiling.get("/")
+def get_profiles():
+    """List the profiles held in the ring buffer, newest first"""
+    return unified_response(True, "Profiles fetched successfully", data={"profiles": list_profiles()})
+
+@profiling.get("/{profile_id}")
+def download_profile(profile_id: int):
+    """Download a profile as collapsed stacks for flamegraph.pl or speedscope"""
+    profile = get_profile(profile_id)
+    if not profile:
+        return unified_response(False, "Profile not found", status_code=404)
+
+    return PlainTextResponse(
+        collapsed_stacks(profile),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
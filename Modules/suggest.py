@@ -0,0 +1,143 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional
+import numpy as np
+from database.movie_db import get_genre_links_from_db, get_search_documents_from_db
+from Modules.catalog_sync import catalog_watcher
+from Modules.title_search import normalize
+
+MAX_SUGGESTIONS = 20
+# Prefixes up to this length have their top suggestions precomputed, longer
+# prefixes cover few enough keys to rank them on the fly
+PRECOMPUTED_PREFIX_LENGTH = 3
+# Extra candidates taken from a range so duplicates can be dropped
+CANDIDATE_FACTOR = 3
+
+KIND_MOVIE = 0
+KIND_ACTOR = 1
+KIND_GENRE = 2
+KIND_NAMES = ("movie", "actor", "genre")
+
+
+class SuggestIndex:
+    """
+    Sorted array of normalized keys for typeahead.
+
+    Every word start of a title, actor name or genre name becomes a key, so
+    "dark kn" finds "The Dark Knight". A prefix is a contiguous range of the
+    sorted keys found with two binary searches, ranked by rating.
+    """
+
+    def __init__(self, movie_rows: List[Dict], cast_rows: List[Dict], genre_rows: List[Dict]):
+        self.labels: List[List[str]] = [[], [], []]
+        self.ratings: List[List[float]] = [[], [], []]
+        entries = []
+
+        def add(kind: int, entity_id: int, label: Optional[str], rating: float):
+            position = len(self.labels[kind])
+            self.labels[kind].append(label)
+            self.ratings[kind].append(rating)
+            words = normalize(label).split()
+            for start in range(len(words)):
+                entries.append((" ".join(words[start:]), kind, entity_id, position))
+
+        movie_ratings = {}
+        for row in movie_rows:
+            rating = float(row.get("rating") or 0)
+            movie_ratings[row["movie_id"]] = rating
+            add(KIND_MOVIE, row["movie_id"], row.get("title"), rating)
+
+        # Actors and genres rank by the best rated movie they appear in
+        actors = {}
+        for row in cast_rows:
+            name, best = actors.get(row["actor_id"], (row.get("actor_name"), 0.0))
+            actors[row["actor_id"]] = (name, max(best, movie_ratings.get(row["movie_id"], 0.0)))
+        for actor_id, (name, rating) in actors.items():
+            add(KIND_ACTOR, actor_id, name, rating)
+
+        genres = {}
+        for row in genre_rows:
+            name, best = genres.get(row["genre_id"], (row.get("genre_name"), 0.0))
+            genres[row["genre_id"]] = (name, max(best, movie_ratings.get(row["movie_id"], 0.0)))
+        for genre_id, (name, rating) in genres.items():
+            add(KIND_GENRE, genre_id, name, rating)
+
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.kinds = np.array([entry[1] for entry in entries], dtype=np.int8)
+        self.ids = np.array([entry[2] for entry in entries], dtype=np.int64)
+        self.positions = np.array([entry[3] for entry in entries], dtype=np.int32)
+        self.scores = np.array([self.ratings[entry[1]][entry[3]] for entry in entries], dtype=np.float32)
+
+        self.precomputed = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+            for prefix in {key[:length] for key in self.keys if len(key) >= length}:
+                self.precomputed[prefix] = self._rank(prefix, MAX_SUGGESTIONS)
+
+    def _range(self, prefix: str):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\uffff", start)
+        return start, end
+
+    def _rank(self, prefix: str, limit: int) -> List[Dict]:
+        start, end = self._range(prefix)
+        if start == end:
+            return []
+
+        scores = self.scores[start:end]
+        take = min(limit * CANDIDATE_FACTOR, len(scores))
+        if take < len(scores):
+            best = np.argpartition(-scores, take - 1)[:take]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")] + start
+
+        suggestions = []
+        seen = set()
+        for entry in best.tolist():
+            kind = int(self.kinds[entry])
+            entity_id = int(self.ids[entry])
+            if (kind, entity_id) in seen:
+                continue
+            seen.add((kind, entity_id))
+            position = int(self.positions[entry])
+            suggestions.append({
+                "type": KIND_NAMES[kind],
+                "id": entity_id,
+                "label": self.labels[kind][position],
+                "rating": self.ratings[kind][position],
+            })
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        precomputed = self.precomputed.get(prefix)
+        if precomputed is not None:
+            return precomputed[:limit]
+        return self._rank(prefix, limit)
+
+
+suggest_index: Optional[SuggestIndex] = None
+
+
+@catalog_watcher.subscribe
+def rebuild_suggest_index():
+    global suggest_index
+    movie_rows, cast_rows, error = get_search_documents_from_db()
+    if error:
+        raise RuntimeError(error)
+    genre_rows, error = get_genre_links_from_db()
+    if error:
+        raise RuntimeError(error)
+    suggest_index = SuggestIndex(movie_rows, cast_rows, genre_rows)
+
+
+def suggest(query: str, limit: int = 10) -> List[Dict]:
+    """Typeahead suggestions, empty until the first index build has finished"""
+    index = suggest_index
+    if index is None:
+        return []
+    return index.suggest(query, limit)
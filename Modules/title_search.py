@@ -0,0 +1,197 @@
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from database.movie_db import get_search_documents_from_db
+from database.user_activity_db import search_movies
+from Helpers.loaders import request_loaders
+from Modules.catalog_sync import catalog_watcher
+
+load_dotenv()
+SEARCH_INDEX_INCLUDE_ACTORS = os.getenv("SEARCH_INDEX_INCLUDE_ACTORS", "true").lower() == "true"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Relevance weights, an exact word beats a word prefix which beats a match
+# inside a word, and a title match beats an actor name match.
+EXACT_WEIGHT = 1.0
+PREFIX_WEIGHT = 0.7
+INFIX_WEIGHT = 0.4
+TITLE_WEIGHT = 1.0
+ACTOR_WEIGHT = 0.5
+TITLE_PREFIX_BONUS = 2.0
+TITLE_PHRASE_BONUS = 1.0
+MAX_TERM_EXPANSIONS = 256
+# Only the best candidates by word score are checked for the phrase bonus
+PHRASE_BONUS_CANDIDATES = 500
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase, strip accents and collapse everything that is not a letter or digit"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(TOKEN_PATTERN.findall(text))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return normalize(text).split()
+
+
+def trigrams(term: str) -> Iterable[str]:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class TitleSearchIndex:
+    """
+    Immutable inverted index over movie titles and actor names.
+
+    Words map to posting arrays of document positions, the sorted vocabulary
+    answers prefix lookups with a binary search, and a trigram index over the
+    vocabulary keeps the old substring semantics of LIKE '%q%'.
+    """
+
+    def __init__(self, movie_rows: List[Dict], cast_rows: Optional[List[Dict]] = None):
+        movie_ids = []
+        ratings = []
+        self.titles: List[str] = []
+
+        positions = {}
+        title_postings: Dict[str, set] = {}
+        for row in movie_rows:
+            position = len(movie_ids)
+            positions[row["movie_id"]] = position
+            movie_ids.append(row["movie_id"])
+            ratings.append(float(row.get("rating") or 0))
+            title = normalize(row.get("title"))
+            self.titles.append(title)
+            for term in title.split():
+                title_postings.setdefault(term, set()).add(position)
+
+        actor_postings: Dict[str, set] = {}
+        for row in cast_rows or []:
+            position = positions.get(row["movie_id"])
+            if position is None:
+                continue
+            for term in tokenize(row.get("actor_name")):
+                actor_postings.setdefault(term, set()).add(position)
+
+        self.movie_ids = np.array(movie_ids, dtype=np.int64)
+        self.ratings = np.array(ratings, dtype=np.float32)
+        self.title_postings = {term: np.fromiter(sorted(docs), dtype=np.int32) for term, docs in title_postings.items()}
+        self.actor_postings = {term: np.fromiter(sorted(docs), dtype=np.int32) for term, docs in actor_postings.items()}
+
+        self.terms = sorted(set(self.title_postings) | set(self.actor_postings))
+        term_trigrams: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                term_trigrams.setdefault(gram, []).append(term_id)
+        self.trigrams = {gram: np.array(term_ids, dtype=np.int32) for gram, term_ids in term_trigrams.items()}
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Find the vocabulary terms a query token matches, with their match weight"""
+        matches = {}
+
+        start = bisect_left(self.terms, token)
+        for term in self.terms[start:start + MAX_TERM_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            matches[term] = EXACT_WEIGHT if term == token else PREFIX_WEIGHT
+
+        if len(token) >= 3:
+            candidates = None
+            for gram in trigrams(token):
+                term_ids = self.trigrams.get(gram)
+                if term_ids is None:
+                    candidates = None
+                    break
+                candidates = term_ids if candidates is None else np.intersect1d(candidates, term_ids, assume_unique=True)
+                if not len(candidates):
+                    break
+            for term_id in (candidates if candidates is not None else ())[:MAX_TERM_EXPANSIONS]:
+                term = self.terms[term_id]
+                if term not in matches and token in term:
+                    matches[term] = INFIX_WEIGHT
+
+        return list(matches.items())
+
+    def _score_token(self, token: str) -> np.ndarray:
+        scores = np.zeros(len(self.movie_ids), dtype=np.float32)
+        total = len(self.movie_ids) or 1
+        for term, match_weight in self._expand(token):
+            for postings, field_weight in ((self.title_postings, TITLE_WEIGHT), (self.actor_postings, ACTOR_WEIGHT)):
+                docs = postings.get(term)
+                if docs is None:
+                    continue
+                score = match_weight * field_weight * np.log1p(total / len(docs))
+                scores[docs] = np.maximum(scores[docs], score)
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> List[int]:
+        """Return up to limit movie ids ranked by relevance, then by rating"""
+        normalized_query = normalize(query)
+        tokens = normalized_query.split()
+        if not tokens or not len(self.movie_ids):
+            return []
+
+        # Every query token has to match, a document missing any token drops out
+        scores = None
+        for token in set(tokens):
+            token_scores = self._score_token(token)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = np.where((scores > 0) & (token_scores > 0), scores + token_scores, 0)
+
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+
+        if len(candidates) > PHRASE_BONUS_CANDIDATES:
+            best = np.argpartition(-scores[candidates], PHRASE_BONUS_CANDIDATES - 1)[:PHRASE_BONUS_CANDIDATES]
+            candidates = candidates[best]
+
+        ranked = []
+        for doc in candidates.tolist():
+            score = float(scores[doc])
+            title = self.titles[doc]
+            if title.startswith(normalized_query):
+                score += TITLE_PREFIX_BONUS
+            elif normalized_query in title:
+                score += TITLE_PHRASE_BONUS
+            ranked.append((score, float(self.ratings[doc]), doc))
+
+        ranked.sort(reverse=True)
+        return [int(self.movie_ids[doc]) for _, _, doc in ranked[:limit]]
+
+
+title_index: Optional[TitleSearchIndex] = None
+
+
+@catalog_watcher.subscribe
+def rebuild_title_index():
+    global title_index
+    movie_rows, cast_rows, error = get_search_documents_from_db()
+    if error:
+        raise RuntimeError(error)
+    title_index = TitleSearchIndex(movie_rows, cast_rows if SEARCH_INDEX_INCLUDE_ACTORS else None)
+
+
+def search_titles(query: str, limit: int = 20):
+    """
+    Ranked title search served from the in-memory index, falls back to the
+    database scan until the first index build has finished
+    """
+    index = title_index
+    if index is None:
+        return search_movies(query)
+
+    movie_ids = index.search(query, limit)
+    return request_loaders().movie_summaries.load_many(movie_ids)
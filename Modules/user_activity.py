@@ -1,22 +1,27 @@
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, Query
 from Modules.authentication import get_current_user
 from database.user_activity_db import (
     add_search_history,
     get_search_history,
     delete_search_history,
-    search_movies,
     add_favorite,
     remove_favorite,
+    add_favorites,
+    remove_favorites,
+    replace_favorites,
     update_user_preferences
 )
+from Models.user_activity_models import FavoriteMovies
+from Modules.title_search import search_titles
 from Helpers.custom_response import unified_response
+from Helpers.trending import TRENDING_QUERY_MIN_COUNT, trending_queries
 from typing import List
 
 router = APIRouter(prefix="/user-activity", tags=["User Activity"])
 
 @router.get("/search")
 def search_movies_endpoint(query: str, current_user: dict = Depends(get_current_user)):
-    movies, error = search_movies(query)
+    movies, error = search_titles(query)
     if error:
         return unified_response(False, f"Error searching movies: {error}", status_code=500)
     
@@ -34,6 +39,13 @@ def get_user_search_history(current_user: dict = Depends(get_current_user)):
     
     return unified_response(True, "Search history retrieved successfully", data=search_history)
 
+@router.get("/trending-queries")
+def get_trending_queries(limit: int = Query(10, ge=1, le=50, description="Number of queries")):
+    """Most searched queries over the trending window, rare queries are never shown"""
+    ranked = trending_queries.top(limit, min_count=TRENDING_QUERY_MIN_COUNT)
+    queries = [{"query": query, "count": count} for query, count in ranked]
+    return unified_response(True, "Trending queries fetched successfully", data={"queries": queries})
+
 @router.delete("/search-history/{history_id}")
 def delete_user_search_history(history_id: int, current_user: dict = Depends(get_current_user)):
     deleted, error = delete_search_history(history_id, current_user["id"])
@@ -42,6 +54,30 @@ def delete_user_search_history(history_id: int, current_user: dict = Depends(get
     
     return unified_response(True, "Search history deleted successfully")
 
+@router.post("/favorites/bulk")
+def add_movies_to_favorites(favorites: FavoriteMovies, current_user: dict = Depends(get_current_user)):
+    result, error = add_favorites(current_user["id"], favorites.movie_ids)
+    if error:
+        return unified_response(False, f"Error adding favorites: {error}", status_code=500)
+    
+    return unified_response(True, "Movies added to favorites", data=result)
+
+@router.delete("/favorites/bulk")
+def remove_movies_from_favorites(favorites: FavoriteMovies, current_user: dict = Depends(get_current_user)):
+    result, error = remove_favorites(current_user["id"], favorites.movie_ids)
+    if error:
+        return unified_response(False, f"Error removing favorites: {error}", status_code=500)
+    
+    return unified_response(True, "Movies removed from favorites", data=result)
+
+@router.put("/favorites")
+def replace_user_favorites(favorites: FavoriteMovies, current_user: dict = Depends(get_current_user)):
+    result, error = replace_favorites(current_user["id"], favorites.movie_ids)
+    if error:
+        return unified_response(False, f"Error replacing favorites: {error}", status_code=500)
+    
+    return unified_response(True, "Favorites replaced successfully", data=result)
+
 @router.post("/favorites/{movie_id}")
 def add_movie_to_favorites(movie_id: int, current_user: dict = Depends(get_current_user)):
     favorite, error = add_favorite(current_user["id"], movie_id)
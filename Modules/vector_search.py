@@ -1,30 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, Depends, Header, HTTPException
+from Helpers.profiling import run_in_threadpool
+from typing import List, Dict, Optional
 from Modules.hybrid_vector_store import HybridVectorStore
-from Helpers.jwt_helpers import get_current_user
-from database.movie_db import get_movie_by_id_from_db
+from Modules.catalog_sync import catalog_watcher
+from Helpers.jwt_helpers import get_current_user, get_current_user_profile
+from Helpers.admission import vector_admission
+from Helpers.loaders import request_loaders
 from Modules.movies import format_movie_data
 from database.user_activity_db import add_search_history, get_search_history
-from database.movie_db import get_favorites_movies
+from database.movie_db import get_favorites_movies, get_vector_documents_from_db
+import os
 import requests
-stopwords_list = requests.get("https://gist.githubusercontent.com/rg089/35e00abf8941d72d419224cfd5b5925d/raw/12d899b70156fd0041fa9778d657330b024b959c/stopwords.txt").content
-STOPWORDS = set(stopwords_list.decode().splitlines())
+# Re-embed changed movies whenever the catalog changes. With several serve.py
+# workers enable it for one process (or call /vector/sync) and SIGHUP the master
+VECTOR_AUTO_SYNC = os.getenv("VECTOR_AUTO_SYNC", "false").lower() in ("1", "true", "yes")
+# /vector/sync re-embeds the whole catalog, only internal callers holding this token may run it
+VECTOR_SYNC_TOKEN = os.getenv("VECTOR_SYNC_TOKEN")
+STOPWORDS_URL = os.getenv("STOPWORDS_URL", "https://gist.githubusercontent.com/rg089/35e00abf8941d72d419224cfd5b5925d/raw/12d899b70156fd0041fa9778d657330b024b959c/stopwords.txt")
+try:
+    stopwords_list = requests.get(STOPWORDS_URL, timeout=10).content
+    STOPWORDS = set(stopwords_list.decode().splitlines())
+except Exception as e:
+    # Offline (e.g. load tests), recommendations just keep the stopwords
+    print(f"Error fetching stopwords: {e}")
+    STOPWORDS = set()
 
 
 vector_search = APIRouter(prefix="/vector", tags=["Vector Search"])
 vector_store = HybridVectorStore()
 
-@vector_search.get("/search")
+
+def sync_vector_store():
+    """Make the vector index match the movies table, only changed rows are re-encoded"""
+    rows, error = get_vector_documents_from_db()
+    if error:
+        raise RuntimeError(error)
+    report = vector_store.sync([
+        {"id": row["movie_id"], "movie_id": row["movie_id"], "title": row["title"], "description": row["overview"]}
+        for row in rows
+    ])
+    print(f"Synced vector store: {report}")
+    return report
+
+if VECTOR_AUTO_SYNC:
+    catalog_watcher.subscribe(sync_vector_store)
+
+@vector_search.get("/search", dependencies=[Depends(vector_admission("search"))])
 async def search_movies(
     query: str,
     k: int = 5,
     current_user: Dict = Depends(get_current_user)
 ):
     try:
-        results = vector_store.search(query, k)
+        # In the threadpool, so identical concurrent searches can coalesce
+        results = await run_in_threadpool(vector_store.search, query, k)
         
         # Store search history
-        search_history, history_error = add_search_history(current_user.id, query)
+        search_history, history_error = add_search_history(current_user.id, query, block=False)
         if history_error:
             print(f"Error recording search history: {history_error}")
             
@@ -36,7 +68,7 @@ async def search_movies(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@vector_search.post("/upload")
+@vector_search.post("/upload", dependencies=[Depends(vector_admission("upload"))])
 async def upload_movies(
     movies: List[Dict],
     current_user: Dict = Depends(get_current_user)
@@ -47,10 +79,12 @@ async def upload_movies(
             "success": True,
             "message": f"Successfully uploaded {len(movies)} movies"
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@vector_search.post("/process")
+@vector_search.post("/process", dependencies=[Depends(vector_admission("process"))])
 async def process_movies(
     movies: List[Dict],
     current_user: Dict = Depends(get_current_user)
@@ -61,12 +95,30 @@ async def process_movies(
             "success": True,
             "message": f"Successfully processed {len(movies)} movies"
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@vector_search.get("/recommend")
+def require_sync_token(x_sync_token: Optional[str] = Header(None)):
+    if not VECTOR_SYNC_TOKEN or x_sync_token != VECTOR_SYNC_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@vector_search.post("/sync", dependencies=[Depends(require_sync_token)])
+def sync_movies():
+    try:
+        report = sync_vector_store()
+        return {
+            "success": True,
+            "data": report,
+            "message": "Vector store synced with the catalog"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@vector_search.get("/recommend", dependencies=[Depends(vector_admission("recommend"))])
 async def recommend_movies(
-    current_user: Dict = Depends(get_current_user),
+    current_user: Dict = Depends(get_current_user_profile),
     k: int = 5
 ):
     try:
@@ -91,10 +143,11 @@ async def recommend_movies(
                 query_parts.append(f"language:{language.strip()}")
         
         temp_query = " ".join(query_parts) if query_parts else "popular movies"  # Fallback if no preferences
-        results = vector_store.search(temp_query, k)
+        results = await run_in_threadpool(vector_store.search, temp_query, k)
         response = []
         for movie in results:
-            data, error = get_movie_by_id_from_db(movie.get("movie_id"))
+            # Already fetched by the search, served from the request loader
+            data, error = request_loaders().movies.load(movie.get("movie_id"))
             if data:
                 movie_data = format_movie_data(data)
                 response.append(movie_data)
@@ -108,7 +161,7 @@ async def recommend_movies(
         raise HTTPException(status_code=500, detail=str(e)) 
     
 
-@vector_search.get("/recommendBasedOnHistory")
+@vector_search.get("/recommendBasedOnHistory", dependencies=[Depends(vector_admission("recommendBasedOnHistory"))])
 async def recommend_movies_based_on_history(
     current_user: Dict = Depends(get_current_user),
     k: int = 5
@@ -136,10 +189,11 @@ async def recommend_movies_based_on_history(
         temp_query = " ".join(query_parts)
         
         # Get recommendations using the combined query
-        results = vector_store.search(temp_query, k)
+        results = await run_in_threadpool(vector_store.search, temp_query, k)
         response = []
         for movie in results:
-            data, error = get_movie_by_id_from_db(movie.get("movie_id"))
+            # Already fetched by the search, served from the request loader
+            data, error = request_loaders().movies.load(movie.get("movie_id"))
             if data:
                 movie_data = format_movie_data(data)
                 response.append(movie_data)
@@ -152,7 +206,7 @@ async def recommend_movies_based_on_history(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
     
-@vector_search.get("/recommendBasedOnLikedMovies")
+@vector_search.get("/recommendBasedOnLikedMovies", dependencies=[Depends(vector_admission("recommendBasedOnLikedMovies"))])
 async def recommend_movies_based_on_liked_movies(
     current_user: Dict = Depends(get_current_user),
     k: int = 5
@@ -178,6 +232,9 @@ async def recommend_movies_based_on_liked_movies(
         # Build query based on favorite movies' characteristics
         query_parts = []
         
+        # Fetch every favorite's details in one query
+        request_loaders().movies.prime(movie.get("movie_id") for movie in favorite_movies)
+
         # Process each favorite movie
         for movie in favorite_movies:
             # Add movie title with high weight
@@ -185,7 +242,7 @@ async def recommend_movies_based_on_liked_movies(
                 query_parts.extend([movie["title"]] * 3)  # Triple weight for titles
                 
             # Get detailed movie data to access genres and cast
-            movie_data, error = get_movie_by_id_from_db(movie.get("movie_id"))
+            movie_data, error = request_loaders().movies.load(movie.get("movie_id"))
             if movie_data:
                 # Add genres
                 for genre_relation in movie_data.movie_genres or []:
@@ -204,10 +261,11 @@ async def recommend_movies_based_on_liked_movies(
         temp_query = " ".join(query_parts)
         
         # Get recommendations using the combined query
-        results = vector_store.search(temp_query, k)
+        results = await run_in_threadpool(vector_store.search, temp_query, k)
         response = []
         for movie in results:
-            data, error = get_movie_by_id_from_db(movie.get("movie_id"))
+            # Already fetched by the search, served from the request loader
+            data, error = request_loaders().movies.load(movie.get("movie_id"))
             if data:
                 movie_data = format_movie_data(data)
                 response.append(movie_data)
@@ -0,0 +1,91 @@
+"""
+Measure login latency and event loop stalls under concurrent logins.
+
+    python -m benchmarks.bench_password_hashing --logins 50 --rounds 12
+
+Runs the same burst of password checks twice: inline on the event loop (the
+old /auth/login behaviour) and through the bounded bcrypt executor. A probe
+task sleeping 1 ms in a loop measures how late the event loop wakes up,
+which is the latency every other request on the worker would see.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import bcrypt
+from Helpers.jwt_helpers import (
+    PASSWORD_HASH_QUEUE_LIMIT,
+    PASSWORD_HASH_WORKERS,
+    PasswordHasher,
+    PasswordHasherBusy,
+    verify_password,
+)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def probe_loop_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - started - 0.001) * 1000)
+
+
+async def run_burst(logins: int, password: str, hashed: str, hasher=None):
+    latencies, lags, rejected = [], [], 0
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(stop, lags))
+    await asyncio.sleep(0.01)
+
+    async def login():
+        nonlocal rejected
+        started = time.perf_counter()
+        try:
+            if hasher is None:
+                verify_password(password, hashed)
+            else:
+                await hasher.run(verify_password, password, hashed)
+        except PasswordHasherBusy:
+            rejected += 1
+            return
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return latencies, lags, rejected, elapsed
+
+
+def ms(value):
+    return f"{value:8.1f} ms" if value is not None else f"{'n/a':>8} ms"
+
+
+def report(name, latencies, lags, rejected, elapsed):
+    # Under overload every login may be rejected, there are no latencies then
+    print(
+        f"{name:<10} ok {len(latencies):4d} rejected {rejected:4d} in {elapsed:6.2f}s | "
+        f"login p50 {ms(statistics.median(latencies) if latencies else None)} p95 {ms(percentile(latencies, 0.95) if latencies else None)} | "
+        f"loop lag p99 {ms(percentile(lags, 0.99) if lags else None)} max {ms(max(lags) if lags else None)}"
+    )
+
+
+async def main(logins: int, rounds: int, workers: int, queue_limit: int):
+    password = "correct horse battery staple"
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+    report("inline", *await run_burst(logins, password, hashed))
+    report("executor", *await run_burst(logins, password, hashed, PasswordHasher(workers, queue_limit)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50, help="concurrent logins in the burst")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor of the stored hash")
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS)
+    parser.add_argument("--queue-limit", type=int, default=PASSWORD_HASH_QUEUE_LIMIT)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.rounds, args.workers, args.queue_limit))
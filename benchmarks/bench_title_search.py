@@ -0,0 +1,106 @@
+"""
+Benchmark the in-memory title index against the LIKE '%q%' scan it replaces.
+
+    python -m benchmarks.bench_title_search --movies 500000
+    python -m benchmarks.bench_title_search --db
+
+The synthetic mode compares the index with a linear substring scan over the
+same titles, which is a lower bound for what MySQL does for LIKE '%q%' (no
+network, no row decoding). The --db mode runs both against the live catalog.
+"""
+import argparse
+import random
+import statistics
+import time
+from Modules.title_search import TitleSearchIndex
+
+WORDS = [
+    "the", "dark", "knight", "return", "of", "star", "wars", "lost", "city", "love", "story",
+    "night", "blood", "river", "summer", "last", "man", "woman", "king", "queen", "ghost",
+    "house", "war", "game", "dead", "life", "world", "secret", "road", "fire", "ice", "storm",
+    "silent", "hill", "golden", "empire", "strikes", "back", "rising", "legend", "dragon",
+]
+FIRST_NAMES = ["tom", "emma", "chris", "scarlett", "leonardo", "meryl", "denzel", "natalie", "brad", "cate"]
+LAST_NAMES = ["hanks", "stone", "evans", "johansson", "dicaprio", "streep", "washington", "portman", "pitt", "blanchett"]
+QUERIES = ["dark", "dark kni", "star wars", "lost city", "man", "king", "ghost house", "emp", "legend of the", "hanks"]
+
+
+def synthetic_vocabulary(rng: random.Random, size: int):
+    """Common title words plus generated ones, sampled with a Zipf-like skew like real titles"""
+    syllables = ["ka", "lo", "mi", "ra", "ten", "dor", "vel", "sha", "qui", "ber", "lan", "tis", "mor", "gen"]
+    generated = {"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(size)}
+    vocabulary = WORDS + sorted(generated)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return vocabulary, weights
+
+
+def synthetic_catalog(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocabulary, weights = synthetic_vocabulary(rng, max(count // 5, 1000))
+    movie_rows, cast_rows = [], []
+    for movie_id in range(1, count + 1):
+        title = " ".join(rng.choices(vocabulary, weights, k=rng.randint(1, 5))).title()
+        movie_rows.append({"movie_id": movie_id, "title": title, "rating": round(rng.uniform(1, 10), 1)})
+        for _ in range(3):
+            cast_rows.append({"movie_id": movie_id, "actor_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"})
+    return movie_rows, cast_rows
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def report(name: str, baseline, indexed):
+    print(f"{name:<16} like-scan p50 {baseline[0]:9.3f} ms  max {baseline[1]:9.3f} ms | "
+          f"index p50 {indexed[0]:7.3f} ms  max {indexed[1]:7.3f} ms | x{baseline[0] / max(indexed[0], 1e-6):.0f}")
+
+
+def run_synthetic(count: int, repeat: int):
+    movie_rows, cast_rows = synthetic_catalog(count)
+    started = time.perf_counter()
+    index = TitleSearchIndex(movie_rows, cast_rows)
+    print(f"built index over {len(index)} movies in {time.perf_counter() - started:.2f}s")
+
+    titles = [(row["movie_id"], (row["title"] or "").lower()) for row in movie_rows]
+    for query in QUERIES:
+        needle = query.lower()
+
+        def like_scan():
+            return [movie_id for movie_id, title in titles if needle in title][:20]
+
+        report(query, timed(like_scan, repeat), timed(lambda: index.search(query, 20), repeat))
+
+
+def run_db(repeat: int):
+    from prisma import Prisma, register
+    from database.user_activity_db import search_movies
+    from Modules.title_search import rebuild_title_index, search_titles
+
+    db = Prisma()
+    db.connect()
+    register(db)
+
+    started = time.perf_counter()
+    rebuild_title_index()
+    print(f"built index from the database in {time.perf_counter() - started:.2f}s")
+
+    for query in QUERIES:
+        report(query, timed(lambda: search_movies(query), repeat), timed(lambda: search_titles(query), repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=200000, help="synthetic catalog size")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", action="store_true", help="benchmark against the configured database")
+    args = parser.parse_args()
+
+    if args.db:
+        run_db(args.repeat)
+    else:
+        run_synthetic(args.movies, args.repeat)
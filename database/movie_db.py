@@ -1,14 +1,75 @@
 # This file will contain functions for handling movie-related database operations.
 from prisma.models import movies as PrismaMovies, actors as PrismaActors, genres as PrismaGenres, UserFavorites
+from datetime import datetime
 from typing import List, Optional
-from prisma import Prisma
+from prisma import Prisma, get_client
+from Helpers.circuit_breaker import catalog_breaker, catalog_stale_cache
+from Helpers.metrics import db_timed
+from Helpers.single_flight import coalesced
 
+MOVIE_INCLUDE = {
+    "movie_cast": {
+        "include": {
+            "actors": True
+        }
+    },
+    "movie_genres": {
+        "include": {
+            "genres": True
+        }
+    }
+}
+
+# Cheap change detector for the catalog tables, the checksums are computed
+# server side so only one row travels back per poll.
+CATALOG_FINGERPRINT_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM movies) AS movies,
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', movie_id, title, poster_path, release_date, budget, revenue, runtime, rating, CRC32(overview)))), 0) FROM movies) AS movies_checksum,
+    (SELECT COUNT(*) FROM movie_cast) AS movie_cast,
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', movie_id, actor_id, character_name, credit_order, credit_id))), 0) FROM movie_cast) AS movie_cast_checksum,
+    (SELECT COUNT(*) FROM movie_genres) AS movie_genres,
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', movie_id, genre_id))), 0) FROM movie_genres) AS movie_genres_checksum,
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', actor_id, actor_name, gender, profile_path))), 0) FROM actors) AS actors_checksum,
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS('|', genre_id, genre_name))), 0) FROM genres) AS genres_checksum
+"""
+
+
+def facet_where(rating: Optional[str] = None, decade: Optional[str] = None) -> dict:
+    """
+    Where clause for a rating bucket ("7-8", "unrated") and a decade ("1990s",
+    "unknown"), the same buckets as Modules.facets puts movies in
+    """
+    where_clause = {}
+    if rating == "unrated":
+        where_clause["rating"] = None
+    elif rating:
+        low = int(rating.split("-")[0])
+        # The lowest and highest buckets are open ended, like rating_bucket
+        bounds = {}
+        if low > 0:
+            bounds["gte"] = low
+        if low < 9:
+            bounds["lt"] = low + 1
+        where_clause["rating"] = bounds
+    if decade == "unknown":
+        where_clause["release_date"] = None
+    elif decade:
+        start = int(decade.rstrip("s"))
+        where_clause["release_date"] = {"gte": datetime(start, 1, 1), "lt": datetime(start + 10, 1, 1)}
+    return where_clause
 
+
+@coalesced
+@catalog_breaker.guard(returns=3, stale=catalog_stale_cache)
+@db_timed
 def get_all_movies_from_db(
         page: int = 1, 
         page_size: int = 10, 
         genre_id: Optional[int] = None, 
-        top_n_movies: Optional[int] = None
+        top_n_movies: Optional[int] = None,
+        rating: Optional[str] = None,
+        decade: Optional[str] = None
     ):
     """
     Get all movies with pagination and optional filtering
@@ -17,7 +78,7 @@ def get_all_movies_from_db(
         skip = (page - 1) * page_size
         
         # Build where clause
-        where_clause = {}
+        where_clause = facet_where(rating, decade)
         order_by_clause = []
         if genre_id:
             where_clause["movie_genres"] = {
@@ -55,6 +116,9 @@ def get_all_movies_from_db(
         return None, 0, str(e)
 
 
+@coalesced
+@catalog_breaker.guard(returns=2, stale=catalog_stale_cache)
+@db_timed
 def get_movie_by_id_from_db(movie_id: int):
     """
     Get a single movie by ID with all related data
@@ -82,6 +146,7 @@ def get_movie_by_id_from_db(movie_id: int):
         return None, str(e)
 
 
+@coalesced
 def get_movies_by_genre_from_db(genre_id: int, page: int = 1, page_size: int = 10):
     """
     Get movies filtered by genre
@@ -89,6 +154,8 @@ def get_movies_by_genre_from_db(genre_id: int, page: int = 1, page_size: int = 1
     return get_all_movies_from_db(page=page, page_size=page_size, genre_id=genre_id)
 
 
+@coalesced
+@db_timed
 def get_movies_by_actor_from_db(actor_id: int, page: int = 1, page_size: int = 10):
     """
     Get movies filtered by actor
@@ -108,6 +175,7 @@ def get_movies_by_actor_from_db(actor_id: int, page: int = 1, page_size: int = 1
             where=where_clause,
             skip=skip,
             take=page_size,
+            order={"movie_id": "asc"},
             include={
                 "movie_cast": {
                     "include": {
@@ -130,6 +198,9 @@ def get_movies_by_actor_from_db(actor_id: int, page: int = 1, page_size: int = 1
         return None, 0, str(e)
 
 
+@coalesced
+@catalog_breaker.guard(returns=2, stale=catalog_stale_cache)
+@db_timed
 def get_all_genres_from_db():
     """
     Get all available genres
@@ -141,6 +212,8 @@ def get_all_genres_from_db():
     except Exception as e:
         return None, str(e)
 
+@coalesced
+@db_timed
 def get_top_n_movies(n, genre_id):
     try:
         where_clause = {}
@@ -149,7 +222,11 @@ def get_top_n_movies(n, genre_id):
         }
 
         if genre_id:
-            where_clause['genre_id'] = genre_id
+            where_clause['movie_genres'] = {
+                'some': {
+                    'genre_id': genre_id
+                }
+            }
         
         order_by_clause = [
             {
@@ -174,8 +251,9 @@ def get_top_n_movies(n, genre_id):
             
         return movies, total_count, None
     except Exception as e:
-        return None, str(e)
+        return None, 0, str(e)
     
+@db_timed
 def get_favorites_movies(
     page: int = 1,
     page_size: int = 10,
@@ -217,4 +295,169 @@ def get_favorites_movies(
         return movies, total_count, None
 
     except Exception as e:
-        return [], 0, str(e)
\ No newline at end of file
+        return [], 0, str(e)
+
+
+@coalesced
+@catalog_breaker.guard(returns=2, stale=catalog_stale_cache)
+@db_timed
+def get_movies_by_ids_from_db(movie_ids: List[int], include_relations: bool = True):
+    """
+    Get several movies in a single query, returned in the order of movie_ids
+    """
+    try:
+        if not movie_ids:
+            return [], None
+
+        movies = PrismaMovies.prisma().find_many(
+            where={"movie_id": {"in": list(set(movie_ids))}},
+            include=MOVIE_INCLUDE if include_relations else None
+        )
+
+        movies_by_id = {movie.movie_id: movie for movie in movies}
+        return [movies_by_id[movie_id] for movie_id in movie_ids if movie_id in movies_by_id], None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_catalog_fingerprint():
+    """
+    Get a fingerprint of the catalog tables, it changes whenever a movie,
+    cast entry, genre link, actor or genre is added, removed or edited
+    """
+    try:
+        row = get_client().query_first(CATALOG_FINGERPRINT_SQL)
+        return tuple(str(row[key]) for key in sorted(row)), None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_search_documents_from_db():
+    """
+    Get the slim rows needed to build the in-memory title search index
+    """
+    try:
+        client = get_client()
+        movie_rows = client.query_raw("SELECT movie_id, title, rating FROM movies")
+        cast_rows = client.query_raw(
+            "SELECT mc.movie_id, a.actor_id, a.actor_name FROM movie_cast mc "
+            "JOIN actors a ON a.actor_id = mc.actor_id"
+        )
+        return movie_rows, cast_rows, None
+
+    except Exception as e:
+        return None, None, str(e)
+
+
+@db_timed
+def get_genre_links_from_db():
+    """
+    Get every movie to genre link with the genre name, without the movie rows
+    """
+    try:
+        genre_rows = get_client().query_raw(
+            "SELECT mg.movie_id, g.genre_id, g.genre_name FROM movie_genres mg "
+            "JOIN genres g ON g.genre_id = mg.genre_id"
+        )
+        return genre_rows, None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_facet_rows_from_db():
+    """
+    Get the rating and release year of every movie for the facet index
+    """
+    try:
+        rows = get_client().query_raw("SELECT movie_id, rating, YEAR(release_date) AS year FROM movies")
+        return rows, None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_leaderboard_movies_from_db():
+    """
+    Get the sort columns of every movie that can appear on a top-N leaderboard,
+    release_day is the release date as a day number
+    """
+    try:
+        rows = get_client().query_raw(
+            "SELECT movie_id, rating, TO_DAYS(release_date) AS release_day, revenue FROM movies WHERE revenue > 0"
+        )
+        return rows, None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_cast_pairs_from_db():
+    """
+    Get every (movie_id, actor_id) pair of movie_cast
+    """
+    try:
+        rows = get_client().query_raw("SELECT movie_id, actor_id FROM movie_cast")
+        return [(row["movie_id"], row["actor_id"]) for row in rows], None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@coalesced
+@db_timed
+def get_actors_by_ids_from_db(actor_ids: List[int]):
+    """
+    Get several actors in a single query, returned in the order of actor_ids
+    """
+    try:
+        if not actor_ids:
+            return [], None
+
+        actors = PrismaActors.prisma().find_many(where={"actor_id": {"in": list(set(actor_ids))}})
+
+        actors_by_id = {actor.actor_id: actor for actor in actors}
+        return [actors_by_id[actor_id] for actor_id in actor_ids if actor_id in actors_by_id], None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_movies_after_from_db(after_movie_id: int, limit: int):
+    """
+    Get the next limit movies with relations ordered by movie_id, starting
+    after after_movie_id. Keyset pagination, so every chunk is an index range
+    scan however deep into the catalog it is
+    """
+    try:
+        movies = PrismaMovies.prisma().find_many(
+            where={"movie_id": {"gt": after_movie_id}},
+            include=MOVIE_INCLUDE,
+            order={"movie_id": "asc"},
+            take=limit
+        )
+        return movies, None
+
+    except Exception as e:
+        return None, str(e)
+
+
+@db_timed
+def get_vector_documents_from_db():
+    """
+    Get the text embedded in the vector store for every movie
+    """
+    try:
+        rows = get_client().query_raw("SELECT movie_id, title, overview FROM movies")
+        return rows, None
+
+    except Exception as e:
+        return None, str(e)
@@ -1,21 +1,47 @@
 from prisma.models import UserSearchHistory, movies as Movies, UserFavorites, Users as PrismaUsers
 from typing import Optional, Tuple, List
-from prisma import Prisma
+from datetime import datetime, timezone
+from prisma import Prisma, get_client
+from prisma.errors import DataError, ForeignKeyViolationError, UniqueViolationError
+import os
+from database.write_behind import WriteBehindBuffer
+from database.user_db import invalidate_user_cache
+from Helpers.metrics import db_timed
+from Helpers.keys import normalize_query
+from Helpers.trending import trending_movies, trending_queries
 
 db = Prisma()
 
-def add_search_history(user_id: int, query: str) -> Tuple[Optional[dict], Optional[str]]:
-    try:
-        search_history = UserSearchHistory.prisma().create(
-            data= {
-                "user":{"connect":{"id": user_id}},
-                "query": query
-            }
-        )
-        return search_history, None
-    except Exception as e:
-        return None, str(e)
+@db_timed
+def insert_search_history_batch(rows: List[dict]):
+    UserSearchHistory.prisma().create_many(data=rows)
+
+# Search history is written behind the request, in batches
+search_history_buffer = WriteBehindBuffer(
+    "search history",
+    insert_search_history_batch,
+    max_batch=int(os.getenv("SEARCH_HISTORY_BATCH_SIZE", "100")),
+    max_delay=float(os.getenv("SEARCH_HISTORY_FLUSH_SECONDS", "1.0")),
+    capacity=int(os.getenv("SEARCH_HISTORY_BUFFER_SIZE", "10000")),
+    put_timeout=float(os.getenv("SEARCH_HISTORY_PUT_TIMEOUT_SECONDS", "0.05")),
+)
 
+def add_search_history(user_id: int, query: str, block: bool = True) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Queue a search history row, it is inserted within SEARCH_HISTORY_FLUSH_SECONDS.
+    Async endpoints pass block=False so a full buffer never stalls the event loop
+    """
+    row = {
+        "userId": user_id,
+        "query": query,
+        "timestamp": datetime.now(timezone.utc)
+    }
+    trending_queries.add(normalize_query(query))
+    if not search_history_buffer.add(row, block=block):
+        return None, "Search history buffer is full, entry dropped"
+    return row, None
+
+@db_timed
 def get_search_history(user_id: int) -> Tuple[Optional[List[dict]], Optional[str]]:
     try:
         search_history = UserSearchHistory.prisma().find_many(
@@ -26,6 +52,7 @@ def get_search_history(user_id: int) -> Tuple[Optional[List[dict]], Optional[str
     except Exception as e:
         return None, str(e)
 
+@db_timed
 def delete_search_history(history_id: int, user_id: int) -> Tuple[Optional[dict], Optional[str]]:
     try:
         history = UserSearchHistory.prisma().find_unique(
@@ -42,6 +69,7 @@ def delete_search_history(history_id: int, user_id: int) -> Tuple[Optional[dict]
     except Exception as e:
         return None, str(e)
 
+@db_timed
 def search_movies(query: str) -> Tuple[Optional[List[dict]], Optional[str]]:
     try:
         movies = Movies.prisma().find_many(
@@ -56,52 +84,137 @@ def search_movies(query: str) -> Tuple[Optional[List[dict]], Optional[str]]:
     except Exception as e:
         return None, str(e)
 
+# A single favorite is one plain INSERT, the movie foreign key and the
+# (userId, movieId) unique key report a missing movie or a duplicate.
+# Bulk writes use INSERT ... SELECT FROM movies so missing movies are skipped.
+# Timestamps are UTC like the @default(now()) Prisma fills in, NOW(3) would
+# follow the session time zone
+ADD_FAVORITE_SQL = (
+    "INSERT INTO `UserFavorites` (`userId`, `movieId`, `timestamp`) VALUES (?, ?, UTC_TIMESTAMP(3))"
+)
+ADD_FAVORITES_SQL = (
+    "INSERT IGNORE INTO `UserFavorites` (`userId`, `movieId`, `timestamp`) "
+    "SELECT ?, `movie_id`, UTC_TIMESTAMP(3) FROM `movies` WHERE `movie_id` IN ({placeholders})"
+)
+# Catalog movies among the ids that are not favorites yet, the ones a bulk
+# insert adds and feeds to the trending counts. A locking read, so a
+# concurrent add for the same user waits until the insert has committed
+NEW_FAVORITES_SQL = (
+    "SELECT `movie_id` FROM `movies` WHERE `movie_id` IN ({placeholders}) "
+    "AND `movie_id` NOT IN (SELECT `movieId` FROM `UserFavorites` WHERE `userId` = ?) "
+    "FOR UPDATE"
+)
+
+def _mysql_error(error: DataError, code: str, error_type: type) -> bool:
+    # Raw queries surface MySQL errors as RawQueryError with the server code in the message
+    return isinstance(error, error_type) or f"Code: `{code}`" in str(error)
+
+@db_timed
 def add_favorite(user_id: int, movie_id: int) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Add a favorite in one statement, without a lookup of the movie first
+    """
     try:
-        movie = Movies.prisma().find_unique(where={"movie_id": movie_id})
-        if not movie:
-            return None, "Movie not found"
-
-        UserFavorites.prisma().create(
-            data={
-                'user': {
-                    'connect': {'id': user_id}
-                },
-                'movie': {
-                    'connect': {'movie_id': movie_id}
-                }
-            }
-        )
+        get_client().execute_raw(ADD_FAVORITE_SQL, user_id, movie_id)
+        trending_movies.add(movie_id)
         return "Success", None
+    except DataError as e:
+        if _mysql_error(e, "1452", ForeignKeyViolationError):
+            return None, "Movie not found"
+        if _mysql_error(e, "1062", UniqueViolationError):
+            return None, "Movie is already in favorites"
+        return None, str(e)
     except Exception as e:
         return None, str(e)
 
+@db_timed
 def remove_favorite(user_id: int, movie_id: int) -> Tuple[Optional[dict], Optional[str]]:
     try:
-        favorite = UserFavorites.prisma().find_unique(
+        deleted = UserFavorites.prisma().delete_many(
             where={
-                "userId_movieId": {
-                    "userId": user_id,
-                    "movieId": movie_id
-                }
+                "userId": user_id,
+                "movieId": movie_id
             }
         )
         
-        if not favorite:
+        if not deleted:
             return None, "Favorite not found"
         
-        deleted = UserFavorites.prisma().delete(
+        return deleted, None
+    except Exception as e:
+        return None, str(e)
+
+def _insert_favorites(client, user_id: int, movie_ids: List[int]) -> List[int]:
+    """
+    Insert the favorites that are new and in the catalog, returns their ids.
+    client must be a transaction, the select and the insert belong together
+    """
+    if not movie_ids:
+        return []
+    placeholders = ", ".join("?" for _ in movie_ids)
+    new_ids = [row["movie_id"] for row in client.query_raw(NEW_FAVORITES_SQL.format(placeholders=placeholders), *movie_ids, user_id)]
+    if new_ids:
+        client.execute_raw(ADD_FAVORITES_SQL.format(placeholders=", ".join("?" for _ in new_ids)), user_id, *new_ids)
+    return new_ids
+
+@db_timed
+def add_favorites(user_id: int, movie_ids: List[int]) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Add several favorites in one transaction, ids already favorited or not in
+    the catalog are skipped
+    """
+    try:
+        movie_ids = list(dict.fromkeys(movie_ids))
+        with get_client().tx() as transaction:
+            added = _insert_favorites(transaction, user_id, movie_ids)
+        # Counted once the transaction has committed
+        for movie_id in added:
+            trending_movies.add(movie_id)
+        return {"requested": len(movie_ids), "added": len(added)}, None
+    except Exception as e:
+        return None, str(e)
+
+@db_timed
+def remove_favorites(user_id: int, movie_ids: List[int]) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Remove several favorites in one statement, ids that are not favorites are skipped
+    """
+    try:
+        movie_ids = list(dict.fromkeys(movie_ids))
+        removed = UserFavorites.prisma().delete_many(
             where={
-                "userId_movieId": {
+                "userId": user_id,
+                "movieId": {"in": movie_ids}
+            }
+        ) if movie_ids else 0
+        return {"requested": len(movie_ids), "removed": removed}, None
+    except Exception as e:
+        return None, str(e)
+
+@db_timed
+def replace_favorites(user_id: int, movie_ids: List[int]) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Make the favorites exactly movie_ids in one transaction, favorites that
+    are kept keep their timestamp
+    """
+    try:
+        movie_ids = list(dict.fromkeys(movie_ids))
+        with get_client().tx() as transaction:
+            removed = UserFavorites.prisma(transaction).delete_many(
+                where={
                     "userId": user_id,
-                    "movieId": movie_id
+                    "movieId": {"not_in": movie_ids}
                 }
-            }
-        )
-        return deleted, None
+            )
+            added = _insert_favorites(transaction, user_id, movie_ids)
+        # Counted once the transaction has committed
+        for movie_id in added:
+            trending_movies.add(movie_id)
+        return {"requested": len(movie_ids), "added": len(added), "removed": removed}, None
     except Exception as e:
         return None, str(e)
 
+@db_timed
 def update_user_preferences(user_id: int, languages: str, genres: str, location: str) -> Tuple[bool, Optional[str]]:
     """
     Update user preferences in the database
@@ -117,6 +230,7 @@ def update_user_preferences(user_id: int, languages: str, genres: str, location:
                 "location": location
             }
         )
+        invalidate_user_cache(user_id)
         return True, None
     except Exception as e:
         return False, str(e)
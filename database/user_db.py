@@ -1,6 +1,16 @@
+import os
 from prisma.models import Users as PrismaUsers
 from prisma.errors import UniqueViolationError
+from Helpers.ttl_cache import TTLCache
+from Helpers.metrics import db_timed
 
+# Short-lived cache of full user records for endpoints that need the profile
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+)
+
+@db_timed
 def create_user_in_db(user_data):
     try:
         response = PrismaUsers.prisma().create(data=user_data)
@@ -11,7 +21,36 @@ def create_user_in_db(user_data):
         return None, str(e)
 
 
+@db_timed
 def find_user_by_email_or_username(email=None, username=None):
     if email:
         return PrismaUsers.prisma().find_first(where={"email": email})
-    return PrismaUsers.prisma().find_first(where={"username": username}) 
\ No newline at end of file
+    return PrismaUsers.prisma().find_first(where={"username": username}) 
+
+
+@db_timed
+def fetch_user_by_id(user_id: int):
+    return PrismaUsers.prisma().find_unique(where={"id": user_id})
+
+
+def find_user_by_id(user_id: int):
+    user = user_cache.get(user_id)
+    if user is None:
+        user = fetch_user_by_id(user_id)
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+
+@db_timed
+def update_user_password(user_id: int, hashed_password: str):
+    try:
+        PrismaUsers.prisma().update(where={"id": user_id}, data={"password": hashed_password})
+        invalidate_user_cache(user_id)
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+
+def invalidate_user_cache(user_id: int):
+    user_cache.delete(user_id)
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+from Helpers.metrics import CallbackGauge
+
+_buffers: List["WriteBehindBuffer"] = []
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue that takes rows off the request path and writes
+    them in batches from a background thread.
+
+    A batch is written once it reaches max_batch rows or once its oldest row
+    is max_delay seconds old. When the queue is full, add() waits up to
+    put_timeout for room (backpressure) and then drops the row. Callers on
+    the event loop pass block=False to drop straight away instead.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[List[Dict]], None],
+        max_batch: int = 100,
+        max_delay: float = 1.0,
+        capacity: int = 10000,
+        put_timeout: float = 0.05,
+    ):
+        self.name = name
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=capacity)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._counters_lock = threading.Lock()
+        self.counters = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "overflowed": 0,
+            "dropped": 0,
+            "failed": 0,
+        }
+        _buffers.append(self)
+
+    def add(self, row: Dict, block: bool = True) -> bool:
+        """Queue a row, returns False when it had to be dropped"""
+        if self._closed.is_set():
+            self._write([row])
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("overflowed")
+            if not block:
+                self._count("dropped")
+                return False
+            try:
+                self._queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    def _count(self, name: str, amount: int = 1):
+        with self._counters_lock:
+            self.counters[name] += amount
+
+    def counts(self) -> Dict[str, int]:
+        """Copy of the counters, safe to iterate while the writer runs"""
+        with self._counters_lock:
+            return dict(self.counters)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: float = 10.0):
+        """Stop the background thread and write everything still queued"""
+        self._closed.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._drain()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.max_delay)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _drain(self):
+        while True:
+            batch = []
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]):
+        with self._write_lock:
+            try:
+                self.write_batch(batch)
+                self._count("written", len(batch))
+                self._count("batches")
+            except Exception as e:
+                self._count("failed", len(batch))
+                print(f"Error writing {len(batch)} {self.name} rows: {e}")
+
+
+CallbackGauge(
+    "write_behind_rows_total", "Rows handled by write-behind buffers", ["buffer", "outcome"],
+    lambda: {(buffer.name, outcome): count for buffer in _buffers for outcome, count in buffer.counts().items()},
+    type="counter",
+)
+CallbackGauge(
+    "write_behind_pending_rows", "Rows waiting in write-behind buffers", ["buffer"],
+    lambda: {(buffer.name,): buffer.pending() for buffer in _buffers},
+)
@@ -0,0 +1,70 @@
+"""
+Synthetic catalog for load tests: genres, actors, movies, cast and genre
+links with TMDB-like shapes, generated deterministically from a seed.
+"""
+import random
+from datetime import datetime
+from typing import Dict, List
+
+GENRES = [
+    (28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"),
+    (99, "Documentary"), (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"),
+    (27, "Horror"), (10402, "Music"), (9648, "Mystery"), (10749, "Romance"), (878, "Science Fiction"),
+    (10770, "TV Movie"), (53, "Thriller"), (10752, "War"), (37, "Western"),
+]
+TITLE_WORDS = [
+    "the", "dark", "knight", "return", "of", "star", "wars", "lost", "city", "love", "story", "night",
+    "blood", "river", "summer", "last", "man", "woman", "king", "queen", "ghost", "house", "war", "game",
+    "dead", "life", "world", "secret", "road", "fire", "ice", "storm", "silent", "hill", "golden",
+    "empire", "rising", "legend", "dragon", "shadow", "island", "journey", "heart", "dream",
+]
+FIRST_NAMES = ["Tom", "Emma", "Chris", "Scarlett", "Leonardo", "Meryl", "Denzel", "Natalie", "Brad", "Cate", "Viola", "Keanu"]
+LAST_NAMES = ["Hanks", "Stone", "Evans", "Johansson", "DiCaprio", "Streep", "Washington", "Portman", "Pitt", "Blanchett", "Davis", "Reeves"]
+
+
+def generate_catalog(movies: int, actors: int, seed: int = 42) -> Dict[str, List[Dict]]:
+    rng = random.Random(seed)
+    genre_rows = [{"genre_id": genre_id, "genre_name": name} for genre_id, name in GENRES]
+
+    actor_rows = [
+        {
+            "actor_id": actor_id,
+            "actor_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {actor_id}",
+            "gender": rng.choice([0, 1, 2]),
+            "profile_path": f"/profiles/{actor_id}.jpg",
+        }
+        for actor_id in range(1, actors + 1)
+    ]
+
+    movie_rows, cast_rows, movie_genre_rows = [], [], []
+    for movie_id in range(1, movies + 1):
+        title = " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 4))).title()
+        movie_rows.append({
+            "movie_id": movie_id,
+            "title": title,
+            "poster_path": f"/posters/{movie_id}.jpg",
+            "release_date": datetime(rng.randint(1960, 2024), rng.randint(1, 12), rng.randint(1, 28)),
+            "budget": rng.randint(0, 200_000_000),
+            "revenue": rng.choice([0, rng.randint(1_000, 2_000_000_000)]),
+            "runtime": float(rng.randint(70, 190)),
+            "overview": " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(20, 60))),
+            "rating": round(rng.uniform(1, 10), 1),
+        })
+        for credit_order, actor_id in enumerate(rng.sample(range(1, actors + 1), min(actors, rng.randint(3, 10)))):
+            cast_rows.append({
+                "movie_id": movie_id,
+                "actor_id": actor_id,
+                "character_name": f"Character {credit_order + 1}",
+                "credit_order": credit_order,
+                "credit_id": f"{movie_id}-{actor_id}",
+            })
+        for genre_id, _ in rng.sample(GENRES, rng.randint(1, 3)):
+            movie_genre_rows.append({"movie_id": movie_id, "genre_id": genre_id})
+
+    return {
+        "genres": genre_rows,
+        "actors": actor_rows,
+        "movies": movie_rows,
+        "movie_cast": cast_rows,
+        "movie_genres": movie_genre_rows,
+    }
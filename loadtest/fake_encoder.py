@@ -0,0 +1,29 @@
+"""
+Deterministic stand-in for the sentence transformer, selected with
+VECTOR_ENCODER=fake. Texts sharing words get similar vectors, which is
+enough to exercise the FAISS and hydration path without downloading a model.
+"""
+import hashlib
+from typing import List
+import numpy as np
+
+DIMENSION = 384
+
+
+class FakeEncoder:
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in str(text).lower().split():
+                embeddings[row] += self._word_vector(word)
+            norm = np.linalg.norm(embeddings[row])
+            if norm:
+                embeddings[row] /= norm
+        return embeddings
@@ -1,10 +1,19 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from prisma import Prisma, register
 from Modules.authentication import auth
 from Modules.movies import movies
 from Modules.user_activity import router as user_activity
 from Modules.vector_search import vector_search
+from Modules.actors import actors
+from Modules.catalog_sync import catalog_watcher
+from database.user_activity_db import search_history_buffer
+from Helpers.loaders import LoaderMiddleware
+from Helpers.metrics import MetricsMiddleware, render_metrics
+from Helpers.profiling import PROFILING_ENABLED, ProfilingMiddleware
+from Modules.profiling import profiling
 
 app = FastAPI()
 
@@ -17,15 +26,57 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# SQL Database
-db = Prisma()
-db.connect()
+# Request-scoped batch loaders for movie and actor lookups
+app.add_middleware(LoaderMiddleware)
+
+# Per-route latency histograms and in-flight gauges, served on /metrics
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+
+# On-demand request profiling, not installed at all unless configured
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, routes=app.router.routes)
+
+# SQL Database, DATABASE_URL overrides the url in prisma/schema.prisma
+# (the load-test harness points it at a local database). It connects in
+# the startup hook so every serve.py worker gets its own engine after fork.
+# The client timeout is a backstop for everything, including the full-table
+# catalog loads of the background jobs. Request-path catalog reads get the
+# much shorter DB_QUERY_TIMEOUT_SECONDS deadline from the circuit breaker
+db_options = {"http": {"timeout": float(os.getenv("DB_CLIENT_TIMEOUT_SECONDS", "300"))}}
+if os.getenv("DATABASE_URL"):
+    db_options["datasource"] = {"url": os.environ["DATABASE_URL"]}
+db = Prisma(**db_options)
 register(db)
 
 app.include_router(auth)
 app.include_router(movies)
 app.include_router(user_activity)
 app.include_router(vector_search)
+app.include_router(actors)
+if PROFILING_ENABLED:
+    app.include_router(profiling)
+
+@app.on_event("startup")
+def connect_database():
+    db.connect()
+
+@app.on_event("startup")
+def start_catalog_sync():
+    # Builds the in-memory catalog indexes in the background and keeps them in sync
+    catalog_watcher.start()
+
+@app.on_event("shutdown")
+def flush_write_behind_buffers():
+    search_history_buffer.close()
+
+@app.on_event("shutdown")
+def disconnect_database():
+    if db.is_connected():
+        db.disconnect()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -0,0 +1,177 @@
+"""
+Prefork server for running main:app on several workers.
+
+    WEB_CONCURRENCY=4 python serve.py --host 0.0.0.0 --port 8000
+
+The master imports main:app once, which loads the sentence transformer and
+the FAISS index, freezes the heap and then forks the workers. Workers share
+those pages copy-on-write instead of each loading its own copy. Everything
+that must not cross a fork (the Prisma engine connection, the catalog
+watcher thread, write-behind threads, executors) is started per worker by
+the app startup hooks, after the fork.
+
+Signals:
+    SIGHUP to the master     reload the vector index from disk in the master,
+                             then replace the workers one by one so the new
+                             index is shared again; the socket stays open
+    SIGUSR1 to the master    forwarded to every worker
+    SIGUSR1 to a worker      reload that worker's index in place
+    SIGTERM/SIGINT           graceful shutdown, in-flight requests finish
+
+In-process state such as rate limit buckets, caches and /metrics counters
+is per worker.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+import uvicorn
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GRACEFUL_TIMEOUT_SECONDS = float(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, vector_store, log_level: str):
+    # Handlers installed by the master must not fire in the worker
+    for signum in (signal.SIGHUP, signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    # Reading the index takes a while, keep it out of the signal handler
+    signal.signal(
+        signal.SIGUSR1,
+        lambda signum, frame: threading.Thread(target=vector_store.reload, name="vector-reload", daemon=True).start(),
+    )
+    gc.enable()
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level, timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS))
+    server.run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, app, vector_store, sock: socket.socket, workers: int, log_level: str):
+        self.app = app
+        self.vector_store = vector_store
+        self.sock = sock
+        self.worker_count = workers
+        self.log_level = log_level
+        self.workers = set()
+        self.retiring = set()
+        self.pending_signals = []
+        self.stopping = False
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            self.workers.add(pid)
+            print(f"Started worker {pid}")
+            return pid
+
+        code = 0
+        try:
+            run_worker(self.app, self.sock, self.vector_store, self.log_level)
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+            elif pid in self.workers:
+                self.workers.discard(pid)
+                if not self.stopping:
+                    print(f"Worker {pid} exited with status {status}, restarting")
+                    self.spawn()
+
+    def reload(self):
+        """Load the new index in the master and replace the workers with fresh forks"""
+        if not self.vector_store.reload():
+            return
+        gc.freeze()
+        for pid in list(self.workers):
+            self.spawn()
+            self.workers.discard(pid)
+            self.retiring.add(pid)
+            os.kill(pid, signal.SIGTERM)
+
+    def signal_workers(self, signum: int):
+        for pid in self.workers | self.retiring:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def stop(self):
+        self.stopping = True
+        self.signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT_SECONDS + 5
+        while (self.workers or self.retiring) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.signal_workers(signal.SIGKILL)
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, lambda signum, frame: self.pending_signals.append(signum))
+
+        for _ in range(self.worker_count):
+            self.spawn()
+
+        while True:
+            while self.pending_signals:
+                signum = self.pending_signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGUSR1:
+                    self.signal_workers(signal.SIGUSR1)
+            self.reap()
+            time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Keep the collector from touching the shared objects in the workers,
+    # which would copy their pages
+    gc.disable()
+    from main import app
+    from Modules.vector_search import vector_store
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers, master pid {os.getpid()}")
+    Master(app, vector_store, sock, args.workers, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
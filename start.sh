@@ -4,4 +4,5 @@ prisma generate
 prisma migrate deploy
 
 echo "Starting FastAPI server..."
-uvicorn main:app --host 0.0.0.0 --port 8000
+# WEB_CONCURRENCY workers forked from one master that loads the model and index once
+python serve.py --host 0.0.0.0 --port 8000 --workers "${WEB_CONCURRENCY:-1}"